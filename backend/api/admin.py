@@ -2,14 +2,26 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from extensions import db
 from models.subject import Subject
+from models.chapter import Chapter
 from models.user import User
 from models.quiz import Quiz
 from models.question import Question
-from sqlalchemy import or_
 import datetime
-from tasks.export_tasks import generate_admin_quizzes_csv
+import json
+from tasks.export_tasks import request_admin_quizzes_export, export_attempts_parquet
+from tasks.grading_tasks import regrade_quiz_attempts
+from services.export_service import iter_all_quizzes_csv, csv_response
 from schemas.admin import SubjectSchema, ChapterSchema, QuizSchema, QuestionSchema
 from marshmallow import ValidationError
+from services.answer_key_service import invalidate_answer_key
+from services.analytics_engine import bump_data_version
+from services.reminder_service import reminder_progress
+from services.search_service import search
+from services.pagination import keyset_page
+from services.admin_batch_service import apply_batch, BatchError
+from services.regrade_service import get_regrade_progress
+from services.cache_service import cache_stats
+from services.import_service import import_question_bank, rows_from_tree, rows_from_csv
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -26,18 +38,24 @@ def admin_required(fn):
 @admin_bp.route('/subjects', methods=['GET'])
 @admin_required
 def get_subjects():
-    page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 10))
     search = request.args.get('search', '')
-    query = Subject.query.filter(Subject.deleted_at==None)
+    query = (db.session.query(Subject.id, Subject.name, Subject.description)
+             .filter(Subject.deleted_at==None))
     if search:
         query = query.filter(Subject.name.ilike(f"%{search}%"))
-    total = query.count()
-    subjects = query.offset((page-1)*limit).limit(limit).all()
-    return jsonify({
-        'items': [{'id': s.id,'name': s.name,'description': s.description} for s in subjects],
-        'page': page, 'limit': limit, 'total': total
-    }),200
+    try:
+        subjects, next_cursor = keyset_page(query, [Subject.name, Subject.id], limit,
+                                            request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify(msg=str(e)), 400
+    result = {
+        'items': [s._asdict() for s in subjects],
+        'limit': limit, 'next_cursor': next_cursor
+    }
+    if request.args.get('count') == 'true':
+        result['total'] = query.count()
+    return jsonify(result),200
 # apply similar pagination & search to chapters and quizzes endpoints
 
 @admin_bp.route('/subjects', methods=['POST'])
@@ -142,6 +160,21 @@ def delete_quiz(quiz_id):
     db.session.commit()
     return jsonify(msg='Deleted'), 200
 
+@admin_bp.route('/quizzes/<int:quiz_id>/regrade', methods=['POST'])
+@admin_required
+def regrade_quiz(quiz_id):
+    Quiz.query.get_or_404(quiz_id)
+    job = regrade_quiz_attempts.delay([quiz_id])
+    return jsonify(job_id=job.id), 202
+
+@admin_bp.route('/regrades/<job_id>', methods=['GET'])
+@admin_required
+def get_regrade_status(job_id):
+    progress = get_regrade_progress(job_id)
+    if not progress:
+        return jsonify(msg='Regrade job not found'), 404
+    return jsonify(progress), 200
+
 # --- Questions CRUD ---
 @admin_bp.route('/questions', methods=['POST'])
 @admin_required
@@ -161,6 +194,8 @@ def create_question():
     )
     db.session.add(question)
     db.session.commit()
+    invalidate_answer_key(question.quiz_id)
+    bump_data_version([question.quiz_id])
     return jsonify(id=question.id), 201
 
 @admin_bp.route('/questions/<int:question_id>', methods=['PUT'])
@@ -168,10 +203,17 @@ def create_question():
 def update_question(question_id):
     question = Question.query.get_or_404(question_id)
     data = request.get_json() or {}
+    key_changed = (data.get('correct_option') is not None
+                   and data['correct_option'] != question.correct_option)
     for field in ('statement','option1','option2','option3','option4','correct_option'):
         if data.get(field) is not None:
             setattr(question, field, data[field])
     db.session.commit()
+    invalidate_answer_key(question.quiz_id)
+    bump_data_version([question.quiz_id])
+    if key_changed:
+        job = regrade_quiz_attempts.delay([question.quiz_id])
+        return jsonify(msg='Updated', regrade_job_id=job.id), 200
     return jsonify(msg='Updated'), 200
 
 @admin_bp.route('/questions/<int:question_id>', methods=['DELETE'])
@@ -180,8 +222,33 @@ def delete_question(question_id):
     question = Question.query.get_or_404(question_id)
     question.deleted_at = datetime.datetime.utcnow()
     db.session.commit()
+    invalidate_answer_key(question.quiz_id)
+    bump_data_version([question.quiz_id])
     return jsonify(msg='Deleted'), 200
 
+# --- Batch mutations ---
+@admin_bp.route('/batch', methods=['POST'])
+@admin_required
+def batch_mutations():
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify(msg='Expected a non-empty list of operations'), 400
+    try:
+        result = apply_batch(operations)
+    except BatchError as err:
+        return jsonify(msg=str(err), errors=err.errors), 400
+    regrade = result.pop('regrade_quiz_ids')
+    if regrade:
+        result['regrade_job_id'] = regrade_quiz_attempts.delay(regrade).id
+    return jsonify(result), 200
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    # counters of the worker process serving this request
+    return jsonify(cache_stats()), 200
+
 # --- Search ---
 
 @admin_bp.route('/search', methods=['GET'])
@@ -189,46 +256,82 @@ def delete_question(question_id):
 def search_admin():
     entity = request.args.get('entity')  # users, subjects, quizzes, questions
     q = request.args.get('q', '')
-    page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 10))
+    # columns returned for each entity
     model_map = {
-        'subjects': (Subject, ['name', 'description']),
-        'users': (User, ['full_name', 'email']),
-        'quizzes': (Quiz, ['title']),
-        'questions': (Question, ['statement']),
+        'subjects': (Subject, [Subject.id, Subject.name, Subject.description]),
+        'users': (User, [User.id, User.full_name, User.email, User.role]),
+        'quizzes': (Quiz, [Quiz.id, Quiz.title, Quiz.duration_min]),
+        'questions': (Question, [Question.id, Question.statement]),
     }
     if entity not in model_map:
         return jsonify(msg='Invalid entity'), 400
 
-    Model, search_fields = model_map[entity]
-    
-    query = Model.query
-    if hasattr(Model, 'deleted_at'):
-        query = query.filter(Model.deleted_at == None)
-
-    if q:
-        search_filters = [getattr(Model, field).ilike(f"%{q}%") for field in search_fields]
-        query = query.filter(or_(*search_filters))
-
-    total = query.count()
-    items = query.offset((page - 1) * limit).limit(limit).all()
-
-    def serialize(item):
-        if isinstance(item, User):
-            return {'id': item.id, 'full_name': item.full_name, 'email': item.email, 'role': item.role}
-        elif isinstance(item, Subject):
-            return {'id': item.id, 'name': item.name, 'description': item.description}
-        elif isinstance(item, Quiz):
-            return {'id': item.id, 'title': item.title, 'duration_min': item.duration_min}
-        elif isinstance(item, Question):
-            return {'id': item.id, 'statement': item.statement}
-        return {}
-
-    data = [serialize(item) for item in items]
-    return jsonify({'items': data, 'page': page, 'limit': limit, 'total': total}), 200
+    Model, columns = model_map[entity]
+    cursor = request.args.get('cursor')
+    try:
+        if q:
+            items, next_cursor, total, exact = search(Model, columns, q, limit, cursor)
+        else:
+            query = db.session.query(*columns)
+            if hasattr(Model, 'deleted_at'):
+                query = query.filter(Model.deleted_at == None)
+            items, next_cursor = keyset_page(query, [Model.id], limit, cursor)
+            total, exact = None, False
+            if request.args.get('count') == 'true':
+                total, exact = query.count(), True
+    except ValueError as e:
+        return jsonify(msg=str(e)), 400
+
+    data = [dict(zip((c.key for c in columns), item)) for item in items]
+    return jsonify({'items': data, 'limit': limit, 'next_cursor': next_cursor,
+                    'total': total, 'total_exact': exact}), 200
 
 @admin_bp.route('/exports/quizzes', methods=['POST'])
 @admin_required
 def export_quizzes_csv():
-    job = generate_admin_quizzes_csv.delay()
-    return jsonify(job_id=job.id), 202
\ No newline at end of file
+    export = request_admin_quizzes_export()
+    return jsonify(export), 200 if export['status'] == 'ready' else 202
+
+@admin_bp.route('/exports/parquet', methods=['POST'])
+@admin_required
+def export_parquet_dataset():
+    data = request.get_json(silent=True) or {}
+    job = export_attempts_parquet.delay(full=bool(data.get('full')))
+    return jsonify(job_id=job.id), 202
+
+@admin_bp.route('/exports/quizzes.csv', methods=['GET'])
+@admin_required
+def stream_quizzes_csv():
+    return csv_response(iter_all_quizzes_csv(), 'all_quizzes.csv')
+
+@admin_bp.route('/import', methods=['POST'])
+@admin_required
+def import_questions():
+    if 'file' in request.files:
+        upload = request.files['file']
+        text = upload.read().decode('utf-8-sig')
+        if upload.filename.lower().endswith('.csv'):
+            rows = rows_from_csv(text)
+        else:
+            try:
+                rows = rows_from_tree(json.loads(text))
+            except ValueError:
+                return jsonify(msg='Invalid JSON file'), 400
+    elif request.mimetype == 'text/csv':
+        rows = rows_from_csv(request.get_data(as_text=True))
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            return jsonify(msg='Expected a list of subjects, or a CSV file'), 400
+        rows = rows_from_tree(data)
+    result = import_question_bank(rows)
+    return jsonify(result), 200
+
+@admin_bp.route('/reminders/<run_id>', methods=['GET'])
+@admin_required
+def get_reminder_progress(run_id):
+    progress = reminder_progress(run_id)
+    if progress is None:
+        return jsonify(msg='Reminder run not found'), 404
+    return jsonify(progress), 200
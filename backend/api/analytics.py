@@ -1,14 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from sqlalchemy import func, desc
+from sqlalchemy import func
 from extensions import db, timestamp_limiter
 from models.attempt import Attempt
 from models.user import User
-from models.question import Question
-from models.answer import Answer
 from models.subject import Subject
 from models.quiz import Quiz
-from flask_jwt_extended import get_jwt_identity
+from models.stats import QuestionStats, UserMonthlyStats
+from flask_jwt_extended import get_jwt_identity, get_jwt
+from services.leaderboard_service import (
+    get_quiz_top, get_board_page, get_user_rank, get_user_average, GLOBAL_BOARD)
+from services.pagination import encode_cursor, decode_cursor
+from services.analytics_engine import get_report, data_versions, report_versions
+from services.etag_service import conditional, attempts_versions
 
 analytics_bp = Blueprint('analytics', __name__)
 
@@ -21,89 +25,137 @@ def limit_decorator(limit):
 @analytics_bp.route('/leaderboard/quiz/<int:quiz_id>', methods=['GET'])
 @jwt_required()
 @timestamp_limiter.limit('10000 per minute')
+@conditional(lambda quiz_id: data_versions([quiz_id]))
 def quiz_leaderboard(quiz_id):
     n = int(request.args.get('limit', 10))
-    results = (db.session.query(
-        Attempt.user_id, User.full_name,
-        Attempt.score).join(User, User.id == Attempt.user_id).filter(
-            Attempt.quiz_id == quiz_id).order_by(
-                Attempt.score.desc(), Attempt.submitted_at).limit(n).all())
+    cursor = request.args.get('cursor')
+    try:
+        top, next_after = get_quiz_top(quiz_id, n, decode_cursor(cursor, 2) if cursor else None)
+    except ValueError as e:
+        return jsonify(msg=str(e)), 400
+    names = dict(db.session.query(User.id, User.full_name).filter(
+        User.id.in_([uid for _, uid, _ in top])))
     data = [{
         'user_id': uid,
-        'full_name': name,
+        'full_name': names.get(uid),
         'score': score
-    } for uid, name, score in results]
-    return jsonify(data), 200
+    } for _, uid, score in top]
+    return jsonify({
+        'items': data,
+        'next_cursor': encode_cursor(next_after) if next_after else None
+    }), 200
+
+
+@analytics_bp.route('/leaderboard/users', methods=['GET'])
+@jwt_required()
+@timestamp_limiter.limit('10000 per minute')
+@conditional(lambda: data_versions())
+def users_leaderboard():
+    # Users by average score, overall or for one month (?month=YYYY-MM)
+    n = int(request.args.get('limit', 10))
+    month = request.args.get('month')
+    board = f"month:{month}" if month else GLOBAL_BOARD
+    cursor = request.args.get('cursor')
+    try:
+        page, next_after = get_board_page(board, n, decode_cursor(cursor, 2) if cursor else None)
+    except ValueError as e:
+        return jsonify(msg=str(e)), 400
+    names = dict(db.session.query(User.id, User.full_name).filter(
+        User.id.in_([uid for uid, _ in page])))
+    return jsonify({
+        'items': [{'user_id': uid, 'full_name': names.get(uid), 'avg_score': avg}
+                  for uid, avg in page],
+        'next_cursor': encode_cursor(next_after) if next_after else None
+    }), 200
 
 
 @analytics_bp.route('/leaderboard/user/<int:user_id>', methods=['GET'])
 @jwt_required()
 @timestamp_limiter.limit('10000 per minute')
+@conditional(lambda user_id: data_versions())
 def user_leaderboard(user_id):
     # Average score ranking across all users
-    scores = (db.session.query(
-        Attempt.user_id,
-        func.avg(Attempt.score).label('avg_score')).group_by(
-            Attempt.user_id).order_by(desc('avg_score')).all())
-    ranking = next(
-        (i + 1 for i, (uid, _) in enumerate(scores) if uid == user_id), None)
+    ranking, total_users = get_user_rank(user_id)
     return jsonify({
         'user_id': user_id,
         'ranking': ranking,
-        'total_users': len(scores)
+        'total_users': total_users
     }), 200
 
 
 @analytics_bp.route('/analytics/user/<int:user_id>/monthly', methods=['GET'])
 @jwt_required()
 @timestamp_limiter.limit('10000 per minute')
+@conditional(attempts_versions)
 def analytics_user_monthly(user_id):
-    data = (db.session.query(
-        func.strftime('%Y-%m', Attempt.submitted_at).label('period'),
-        func.avg(Attempt.score).label('avg_score')).filter(
-            Attempt.user_id == user_id).group_by('period').order_by(
-                'period').all())
-    return jsonify([{'period': p, 'avg_score': a} for p, a in data]), 200
+    rows = (db.session.query(UserMonthlyStats.period, UserMonthlyStats.score_sum,
+                             UserMonthlyStats.attempt_count, UserMonthlyStats.score_min,
+                             UserMonthlyStats.score_max, UserMonthlyStats.time_spent_sec)
+            .filter(UserMonthlyStats.user_id == user_id)
+            .order_by(UserMonthlyStats.period).all())
+    return jsonify([{
+        'period': r.period,
+        'avg_score': r.score_sum / r.attempt_count if r.attempt_count else None,
+        'attempts': r.attempt_count,
+        'min_score': r.score_min,
+        'max_score': r.score_max,
+        'time_spent_sec': r.time_spent_sec
+    } for r in rows]), 200
 
 
 @analytics_bp.route('/analytics/quiz/<int:quiz_id>/difficulty',
                     methods=['GET'])
 @jwt_required()
 @timestamp_limiter.limit('10000 per minute')
+@conditional(lambda quiz_id: data_versions([quiz_id]))
 def analytics_quiz_difficulty(quiz_id):
-    # For each question, compute total attempts and correct count
-    subq = (db.session.query(
-        Answer.question_id,
-        func.count(Answer.id).label('total'),
-        func.sum(
-            func.case([(Answer.selected_option == Question.correct_option, 1)],
-                      else_=0)).label('correct')).join(
-                          Question, Answer.question_id == Question.id).filter(
-                              Question.quiz_id == quiz_id).group_by(
-                                  Answer.question_id).subquery())
-    results = db.session.query(subq.c.question_id, subq.c.total,
-                               subq.c.correct).all()
+    # For each question, total answers, correct count and option picks
+    results = (db.session.query(QuestionStats.question_id, QuestionStats.answer_count,
+                                QuestionStats.correct_count, QuestionStats.option1_count,
+                                QuestionStats.option2_count, QuestionStats.option3_count,
+                                QuestionStats.option4_count)
+               .filter(QuestionStats.quiz_id == quiz_id)
+               .order_by(QuestionStats.question_id).all())
     data = []
-    for qid, total, correct in results:
-        percent = (correct / total * 100) if total else 0
+    for s in results:
+        percent = (s.correct_count / s.answer_count * 100) if s.answer_count else 0
         data.append({
-            'question_id': qid,
-            'total': total,
-            'correct': correct,
-            'percent_correct': percent
+            'question_id': s.question_id,
+            'total': s.answer_count,
+            'correct': s.correct_count,
+            'percent_correct': percent,
+            'option_counts': [s.option1_count, s.option2_count,
+                              s.option3_count, s.option4_count]
         })
     return jsonify(data), 200
 
+@analytics_bp.route('/analytics/quiz/<int:quiz_id>/report', methods=['GET'])
+@jwt_required()
+@conditional(lambda quiz_id: report_versions(quiz_id=quiz_id))
+def analytics_quiz_report(quiz_id):
+    if get_jwt().get('role') != 'admin':
+        return jsonify(msg='Admins only'), 403
+    return jsonify(get_report(quiz_id=quiz_id)), 200
+
+
+@analytics_bp.route('/analytics/subject/<int:subject_id>/report', methods=['GET'])
+@jwt_required()
+@conditional(lambda subject_id: report_versions(subject_id=subject_id))
+def analytics_subject_report(subject_id):
+    if get_jwt().get('role') != 'admin':
+        return jsonify(msg='Admins only'), 403
+    return jsonify(get_report(subject_id=subject_id)), 200
+
 @analytics_bp.route('/summary/admin', methods=['GET'])
 @jwt_required()
 def admin_summary():
     if get_jwt().get('role') != 'admin':
         return jsonify(msg='Admins only'), 403
     
-    num_users = User.query.count()
-    num_subjects = Subject.query.count()
-    num_quizzes = Quiz.query.count()
-    num_attempts = Attempt.query.count()
+    num_users = db.session.query(func.count(User.id)).scalar()
+    num_subjects = db.session.query(func.count(Subject.id)).scalar()
+    num_quizzes = db.session.query(func.count(Quiz.id)).scalar()
+    num_attempts = db.session.query(func.count(Attempt.id)).scalar()
 
     return jsonify({
         'users': num_users,
@@ -114,20 +166,15 @@ def admin_summary():
 
 @analytics_bp.route('/summary/user', methods=['GET'])
 @jwt_required()
+@conditional(lambda: attempts_versions(get_jwt_identity()) + data_versions())
 def user_summary():
     user_id = get_jwt_identity()
     
-    total_attempts = Attempt.query.filter_by(user_id=user_id).count()
+    total_attempts = (db.session.query(func.count(Attempt.id))
+                      .filter(Attempt.user_id == user_id).scalar())
     
-    avg_score_result = db.session.query(func.avg(Attempt.score)).filter_by(user_id=user_id).scalar()
-    avg_score = float(avg_score_result) if avg_score_result else 0
-
-    scores = (db.session.query(
-        Attempt.user_id,
-        func.avg(Attempt.score).label('avg_score')).group_by(
-            Attempt.user_id).order_by(desc('avg_score')).all())
-    ranking = next(
-        (i + 1 for i, (uid, _) in enumerate(scores) if uid == user_id), None)
+    avg_score = get_user_average(int(user_id))
+    ranking, _ = get_user_rank(int(user_id))
 
     return jsonify({
         'total_attempts': total_attempts,
@@ -1,59 +1,52 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from extensions import db, cache
+from extensions import db
 from models.quiz import Quiz
 from models.attempt import Attempt
 from models.answer import Answer
 from models.question import Question
+from models.stats import QuizStats
 import datetime
-from sqlalchemy import func
+from sqlalchemy import cast, Float
+from sqlalchemy.exc import IntegrityError
+from services.answer_key_service import get_answer_key
+from services.quiz_service import (
+    get_full_quiz_payload, admit_attempt_start, get_subjects_catalog,
+    get_chapters_catalog, get_quizzes_catalog)
+from services.submission_service import (
+    enqueue_submission, persist_submissions, get_submission_status, attempts_tag)
+from services.autosave_service import save_answer, merge_answers, clear_buffered_answers
+from services.cache_service import invalidate_tags
+from services.etag_service import conditional, catalog_versions, attempts_versions
+from tasks.submission_tasks import schedule_submission_drain
 
 quiz_bp = Blueprint('quiz', __name__)
 
 @quiz_bp.route('/subjects', methods=['GET'])
 @jwt_required()
-@cache.cached(timeout=60)
+@conditional(lambda: catalog_versions('subjects'))
 def get_subjects_public():
-    from models.subject import Subject
-    subjects = Subject.query.filter_by(deleted_at=None).all()
-    return jsonify([{'id': s.id, 'name': s.name} for s in subjects]), 200
+    return jsonify(get_subjects_catalog()), 200
 
 @quiz_bp.route('/subjects/<int:subject_id>/chapters', methods=['GET'])
 @jwt_required()
-@cache.cached(timeout=60)
+@conditional(lambda subject_id: catalog_versions(f"subject:{subject_id}"))
 def get_chapters_public(subject_id):
-    from models.chapter import Chapter
-    chapters = Chapter.query.filter_by(subject_id=subject_id, deleted_at=None).all()
-    return jsonify([{'id': c.id, 'name': c.name} for c in chapters]), 200
+    return jsonify(get_chapters_catalog(subject_id)), 200
 
 @quiz_bp.route('/chapters/<int:chapter_id>/quizzes', methods=['GET'])
 @jwt_required()
-@cache.cached(timeout=60)
+@conditional(lambda chapter_id: catalog_versions(f"chapter:{chapter_id}"))
 def get_quizzes_public(chapter_id):
-    quizzes = Quiz.query.filter_by(chapter_id=chapter_id, deleted_at=None).all()
-    return jsonify([
-        {'id': q.id, 'title': q.title, 'duration_min': q.duration_min, 'scheduled_at': q.scheduled_at}
-        for q in quizzes
-    ]), 200
+    return jsonify(get_quizzes_catalog(chapter_id)), 200
 
 @quiz_bp.route('/quizzes/<int:quiz_id>/full', methods=['GET'])
 @jwt_required()
-@cache.cached(timeout=60)
+@conditional(lambda quiz_id: catalog_versions(f"quiz:{quiz_id}"))
 def get_full_quiz(quiz_id):
-    quiz = Quiz.query.filter_by(id=quiz_id, deleted_at=None).first_or_404()
-    questions = quiz.questions
-    payload = {
-        'quiz_id': quiz.id,
-        'title': quiz.title,
-        'duration_min': quiz.duration_min,
-        'questions': [
-            {
-                'question_id': q.id,
-                'statement': q.statement,
-                'options': [q.option1, q.option2, q.option3, q.option4]
-            } for q in questions
-        ]
-    }
+    payload = get_full_quiz_payload(quiz_id)
+    if payload is None:
+        abort(404)
     return jsonify(payload), 200
 
 @quiz_bp.route('/quizzes/<int:quiz_id>/start', methods=['POST'])
@@ -65,16 +58,30 @@ def start_attempt(quiz_id):
     # Check for existing, unsubmitted attempts
     existing_attempt = Attempt.query.filter_by(quiz_id=quiz_id, user_id=user_id, submitted_at=None).first()
     if existing_attempt:
-        return jsonify(attempt_id=existing_attempt.id, started_at=existing_attempt.started_at.isoformat()), 200
+        return jsonify(attempt_id=existing_attempt.id, started_at=existing_attempt.started_at), 200
+
+    rate = current_app.config.get('ATTEMPT_ADMISSION_RATE')
+    retry_after = admit_attempt_start(rate) if rate else None
+    if retry_after:
+        response = jsonify(msg='Too many quiz starts, retry shortly', retry_after=retry_after)
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
 
     attempt = Attempt(
         quiz_id=quiz_id,
         user_id=user_id,
         started_at=datetime.datetime.utcnow()
     )
-    db.session.add(attempt)
-    db.session.commit()
-    return jsonify(attempt_id=attempt.id, started_at=attempt.started_at.isoformat()), 201
+    try:
+        db.session.add(attempt)
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request created the open attempt first; return that one
+        db.session.rollback()
+        existing_attempt = Attempt.query.filter_by(quiz_id=quiz_id, user_id=user_id, submitted_at=None).one()
+        return jsonify(attempt_id=existing_attempt.id, started_at=existing_attempt.started_at), 200
+    invalidate_tags([attempts_tag(user_id)])
+    return jsonify(attempt_id=attempt.id, started_at=attempt.started_at), 201
 
 @quiz_bp.route('/attempts/<int:attempt_id>/submit', methods=['POST'])
 @jwt_required()
@@ -91,38 +98,92 @@ def submit_attempt(attempt_id):
     time_limit = datetime.timedelta(minutes=quiz.duration_min)
     if datetime.datetime.utcnow() > attempt.started_at + time_limit:
         return jsonify(msg='Time limit exceeded'), 400
-
-    attempt.submitted_at = datetime.datetime.utcnow()
-    
-    score = 0
+    if not isinstance(answers, list):
+        return jsonify(msg='answers must be a list'), 400
+    answer_key = get_answer_key(attempt.quiz_id)
     for ans in answers:
-        q = Answer(
-            attempt_id=attempt.id,
-            question_id=ans['question_id'],
-            selected_option=ans['selected_option']
-        )
-        db.session.add(q)
-        # grading logic: compare with correct_option
-        correct = next((x for x in attempt.quiz.questions if x.id==ans['question_id']), None)
-        if correct and correct.correct_option == ans['selected_option']:
-            score += 1
-    attempt.score = score
-    db.session.commit()
-    return jsonify(attempt_id=attempt.id, score=score), 200
+        if not isinstance(ans, dict) or ans.get('question_id') not in answer_key:
+            return jsonify(msg='Question not in this quiz'), 400
+        if ans.get('selected_option') not in (1, 2, 3, 4):
+            return jsonify(msg='selected_option must be between 1 and 4'), 400
+
+    submitted_at = datetime.datetime.utcnow()
+    answers = merge_answers(attempt.id, answers)
+    if current_app.config.get('SUBMISSION_WRITE_BEHIND'):
+        # accept now, grade and persist in the batched background writer
+        receipt = enqueue_submission(attempt.id, answers, submitted_at)
+        if receipt is None:
+            return jsonify(msg='Attempt already submitted'), 400
+        clear_buffered_answers(attempt.id)
+        schedule_submission_drain()
+        return jsonify(attempt_id=attempt.id, receipt=receipt, status='queued'), 202
+
+    scores = persist_submissions([{
+        'attempt_id': attempt.id,
+        'submitted_at': submitted_at,
+        'answers': answers
+    }])
+    if attempt.id not in scores:
+        return jsonify(msg='Attempt already submitted'), 400
+    clear_buffered_answers(attempt.id)
+    return jsonify(attempt_id=attempt.id, score=scores[attempt.id]), 200
+
+@quiz_bp.route('/attempts/<int:attempt_id>/answers/<int:question_id>', methods=['PUT'])
+@jwt_required()
+def autosave_answer(attempt_id, question_id):
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    selected_option = data.get('selected_option')
+    if selected_option not in (1, 2, 3, 4):
+        return jsonify(msg='selected_option must be between 1 and 4'), 400
+
+    attempt = Attempt.query.filter_by(id=attempt_id, user_id=user_id).first_or_404()
+    if attempt.submitted_at or get_submission_status(attempt.id):
+        return jsonify(msg='Attempt already submitted'), 400
+    time_limit = datetime.timedelta(minutes=attempt.quiz.duration_min)
+    if datetime.datetime.utcnow() > attempt.started_at + time_limit:
+        return jsonify(msg='Time limit exceeded'), 400
+    if question_id not in get_answer_key(attempt.quiz_id):
+        return jsonify(msg='Question not in this quiz'), 404
+
+    save_answer(attempt.id, question_id, selected_option)
+    return jsonify(msg='Saved'), 200
+
+@quiz_bp.route('/attempts/<int:attempt_id>/submission', methods=['GET'])
+@jwt_required()
+def attempt_submission_status(attempt_id):
+    user_id = get_jwt_identity()
+    attempt = (db.session.query(Attempt.id, Attempt.submitted_at, Attempt.score)
+               .filter_by(id=attempt_id, user_id=user_id).first())
+    if attempt is None:
+        abort(404)
+    if attempt.submitted_at:
+        return jsonify(attempt_id=attempt.id, status='persisted', score=attempt.score), 200
+    status = get_submission_status(attempt.id)
+    if not status:
+        return jsonify(msg='No submission for this attempt'), 404
+    return jsonify(attempt_id=attempt.id, status=status['state'],
+                   receipt=status.get('receipt')), 200
 
 @quiz_bp.route('/attempts/<int:attempt_id>', methods=['GET'])
 @jwt_required()
+@conditional(lambda attempt_id: attempts_versions(get_jwt_identity()))
 def get_attempt_detail(attempt_id):
-    attempt = Attempt.query.filter_by(id=attempt_id).first_or_404()
+    attempt = (db.session.query(Attempt.id, Attempt.user_id, Attempt.quiz_id,
+                                Attempt.score, Attempt.submitted_at)
+               .filter(Attempt.id == attempt_id).first())
+    if attempt is None:
+        abort(404)
     if attempt.user_id != int(get_jwt_identity()):
         return jsonify(msg='Forbidden'),403
-    details = [
-        {
-            'question_id': a.question_id,
-            'selected': a.selected_option,
-            'correct': a.question.correct_option
-        } for a in attempt.answers
-    ]
+    # answers and their correct options in one query, not one per answer
+    details = [row._asdict() for row in (
+        db.session.query(Answer.question_id,
+                         Answer.selected_option.label('selected'),
+                         Question.correct_option.label('correct'))
+        .join(Question, Question.id == Answer.question_id)
+        .filter(Answer.attempt_id == attempt_id)
+        .order_by(Answer.id))]
     return jsonify({
         'attempt_id': attempt.id,
         'quiz_id': attempt.quiz_id,
@@ -134,28 +195,14 @@ def get_attempt_detail(attempt_id):
 @quiz_bp.route('/analytics/quizzes/hardest', methods=['GET'])
 @jwt_required()
 def get_hardest_quizzes():
-    # Subquery to get the number of questions for each quiz.
-    questions_count = db.session.query(
-        Question.quiz_id,
-        func.count(Question.id).label('num_questions')
-    ).group_by(Question.quiz_id).subquery()
-    
-    quiz_avg_scores = db.session.query(
-        Attempt.quiz_id,
-        func.avg(Attempt.score / questions_count.c.num_questions).label('avg_score')
-    ).join(questions_count, Attempt.quiz_id == questions_count.c.quiz_id) \
-     .group_by(Attempt.quiz_id) \
-     .subquery()
-    
-    hardest_quizzes_query = db.session.query(
-        Quiz.id,
-        Quiz.title,
-        quiz_avg_scores.c.avg_score
-    ).join(quiz_avg_scores, Quiz.id == quiz_avg_scores.c.quiz_id) \
-     .order_by(quiz_avg_scores.c.avg_score.asc()) \
-     .limit(5)
-
-    results = hardest_quizzes_query.all()
+    avg_score = (cast(QuizStats.score_sum, Float)
+                 / QuizStats.possible_sum).label('avg_score')
+    results = (db.session.query(Quiz.id, Quiz.title, avg_score)
+               .join(QuizStats, QuizStats.quiz_id == Quiz.id)
+               .filter(QuizStats.possible_sum > 0)
+               .order_by(avg_score.asc())
+               .limit(5)
+               .all())
 
     # Formating the final payload.
     payload = [{
@@ -1,8 +1,11 @@
 from flask import Blueprint, jsonify, request, get_flashed_messages
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from tasks.export_tasks import generate_user_attempts_csv
-from extensions import cache
+from tasks.export_tasks import request_user_attempts_export
+from services.export_service import iter_attempts_csv, csv_response
+from extensions import db
 from models.attempt import Attempt
+from services.pagination import keyset_page
+from services.etag_service import conditional, attempts_versions
 import os
 
 user_bp = Blueprint('user', __name__)
@@ -11,22 +14,39 @@ user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/<int:user_id>/attempts', methods=['GET'])
 @jwt_required()
+@conditional(attempts_versions)
 def list_attempts(user_id):
     if int(get_jwt_identity()) != int(user_id):
         return jsonify(msg='Forbidden'), 403
-    attempts = Attempt.query.filter_by(user_id=user_id).all()
-    return jsonify([
-        {'id': a.id, 'quiz_id': a.quiz_id, 'score': a.score, 'submitted_at': a.submitted_at}
-        for a in attempts
-    ]), 200
+    limit = min(int(request.args.get('limit', 50)), 200)
+    try:
+        query = (db.session.query(Attempt.id, Attempt.quiz_id, Attempt.score,
+                                  Attempt.submitted_at, Attempt.started_at)
+                 .filter(Attempt.user_id == user_id))
+        attempts, next_cursor = keyset_page(query, [Attempt.started_at, Attempt.id], limit,
+                                            request.args.get('cursor'), descending=True)
+    except ValueError as e:
+        return jsonify(msg=str(e)), 400
+    return jsonify({
+        'items': [{'id': a.id, 'quiz_id': a.quiz_id, 'score': a.score, 'submitted_at': a.submitted_at}
+                  for a in attempts],
+        'next_cursor': next_cursor
+    }), 200
 
 @user_bp.route('/<int:user_id>/exports/attempts', methods=['POST'])
 @jwt_required()
 def export_attempts_csv(user_id):
     if int(get_jwt_identity()) != int(user_id):
         return jsonify(msg='Forbidden'), 403
-    job = generate_user_attempts_csv.delay(user_id)
-    return jsonify(job_id=job.id), 202
+    export = request_user_attempts_export(user_id)
+    return jsonify(export), 200 if export['status'] == 'ready' else 202
+
+@user_bp.route('/<int:user_id>/exports/attempts.csv', methods=['GET'])
+@jwt_required()
+def stream_attempts_csv(user_id):
+    if int(get_jwt_identity()) != int(user_id):
+        return jsonify(msg='Forbidden'), 403
+    return csv_response(iter_attempts_csv(user_id), f'attempts_{user_id}.csv')
 
 
 @user_bp.route('/<int:user_id>/reports', methods=['GET'])
@@ -2,7 +2,8 @@ from flask import Flask, send_from_directory
 from flask_cors import CORS 
 from config import Config
 from extensions import db, jwt, cache, celery, migrate, timestamp_limiter
-import datetime, os
+from json_provider import FastJSONProvider, isoformat
+import os
 
 EXPORT_DIR = os.path.join(os.getcwd(), 'exports')
 REPORTS_DIR = os.path.join(os.getcwd(), 'reports')
@@ -17,8 +18,9 @@ class ContextTask(celery.Task):
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(Config)
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=["ETag"])
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
@@ -26,10 +28,17 @@ def create_app():
     timestamp_limiter.init_app(app)
     celery.conf.update(app.config)
     celery.Task = ContextTask
+    from services.cache_invalidation import register_cache_invalidation
+    register_cache_invalidation()
 
     # Setting up CLI with the "seed" command
     import seeds
     app.cli.add_command(seeds.seed)
+    import commands
+    app.cli.add_command(commands.leaderboard)
+    app.cli.add_command(commands.stats)
+    app.cli.add_command(commands.export)
+    app.cli.add_command(commands.questions)
 
     # Initializing blueprints
     from api.auth import auth_bp
@@ -52,7 +61,3 @@ def create_app():
         lambda filename: send_from_directory(REPORTS_DIR, filename))
     return app
 
-
-def isoformat(dt: datetime.datetime) -> str:
-    return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
-
@@ -0,0 +1,87 @@
+import json
+import click
+from flask.cli import with_appcontext
+from services.leaderboard_service import rebuild_leaderboards, check_leaderboards
+from services.stats_service import rebuild_stats
+from services.regrade_service import regrade_quizzes
+from services.parquet_export_service import export_parquet
+from services.import_service import import_question_bank, rows_from_tree, rows_from_csv
+
+
+@click.group()
+def leaderboard():
+    """Maintain the Redis leaderboards."""
+
+
+@leaderboard.command('rebuild')
+@with_appcontext
+def leaderboard_rebuild():
+    boards = rebuild_leaderboards()
+    click.echo(f"Rebuilt {boards} leaderboards from attempts")
+
+
+@leaderboard.command('check')
+@with_appcontext
+def leaderboard_check():
+    problems = check_leaderboards()
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise SystemExit(1)
+    click.echo("Leaderboards match the attempts table")
+
+
+@click.group()
+def stats():
+    """Maintain the question and quiz statistics tables."""
+
+
+@stats.command('rebuild')
+@with_appcontext
+def stats_rebuild():
+    questions, quizzes, months = rebuild_stats()
+    click.echo(f"Rebuilt statistics for {questions} questions, {quizzes} quizzes "
+               f"and {months} user months")
+
+
+@stats.command('regrade')
+@click.argument('quiz_ids', nargs=-1, type=int, required=True)
+@with_appcontext
+def stats_regrade(quiz_ids):
+    result = regrade_quizzes(list(quiz_ids))
+    click.echo(f"Regraded {result['attempts']} attempts, {result['changed']} scores changed")
+
+
+@click.group()
+def export():
+    """Bulk data exports."""
+
+
+@export.command('parquet')
+@click.option('--full', is_flag=True, help='Ignore the watermark and export every attempt.')
+@with_appcontext
+def export_parquet_command(full):
+    result = export_parquet(full=full)
+    click.echo(f"Run {result['run_id']}: {result['attempts']} attempts, "
+               f"{result['answers']} answers written")
+
+
+@click.group()
+def questions():
+    """Manage the question bank."""
+
+
+@questions.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def questions_import(path):
+    with open(path, encoding='utf-8-sig') as f:
+        text = f.read()
+    rows = rows_from_csv(text) if path.lower().endswith('.csv') else rows_from_tree(json.loads(text))
+    result = import_question_bank(rows)
+    for error in result['errors']:
+        click.echo(f"row {error['row']}: {error['messages']}", err=True)
+    created = result['created']
+    click.echo(f"Imported {result['rows']} rows: {created['subjects']} subjects, "
+               f"{created['chapters']} chapters, {created['quizzes']} quizzes, "
+               f"{created['questions']} questions created")
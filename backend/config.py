@@ -8,5 +8,56 @@ class Config:
     CELERY_BROKER_URL = 'redis://localhost:6379/1'
     CELERY_RESULT_BACKEND = 'redis://localhost:6379/2'
     RATELIMIT_STORAGE_URL = "redis://localhost:6379"
+    # Redis db for app data structures (answer keys, queues, rankings)
+    REDIS_URL = 'redis://localhost:6379/3'
+    # Accept quiz submissions into a Redis stream and persist them in batches
+    SUBMISSION_WRITE_BEHIND = False
+    SUBMISSION_BATCH_SIZE = 500
+    CELERYBEAT_SCHEDULE = {
+        'flush-autosaved-answers': {
+            'task': 'tasks.autosave_tasks.flush_autosaved_answers',
+            'schedule': 30.0,
+        },
+        'prewarm-quiz-payloads': {
+            'task': 'tasks.quiz_tasks.prewarm_quiz_payloads',
+            'schedule': 60.0,
+        },
+        'close-expired-attempts': {
+            'task': 'tasks.submission_tasks.close_expired_open_attempts',
+            'schedule': 60.0,
+        },
+        'sweep-export-dir': {
+            'task': 'tasks.export_tasks.sweep_export_dir',
+            'schedule': 3600.0,
+        },
+        'dispatch-email-outbox': {
+            'task': 'tasks.email_tasks.dispatch_email_outbox',
+            'schedule': 10.0,
+        },
+    }
+    # Least recently used exports are deleted beyond this total size
+    EXPORT_DIR_MAX_BYTES = 512 * 1024 * 1024
+    # Email outbox: messages claimed per dispatch, max messages per second
+    # across all dispatchers, and retries with exponential backoff from
+    # EMAIL_RETRY_BASE_SEC
+    EMAIL_BATCH_SIZE = 200
+    EMAIL_SEND_RATE = 10
+    EMAIL_MAX_ATTEMPTS = 5
+    EMAIL_RETRY_BASE_SEC = 30
+    # In-process cache tier: total size, and how long each endpoint's
+    # entries are kept locally (endpoints not listed skip the local tier)
+    LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    LOCAL_CACHE_TIMEOUTS = {
+        'subjects': 300,
+        'chapters': 300,
+        'quizzes': 300,
+        'full_quiz': 300,
+    }
+    # Users per daily-reminder subtask
+    REMINDER_CHUNK_SIZE = 500
+    # Users per monthly-report rendering subtask
+    REPORT_CHUNK_SIZE = 50
+    # Max attempts created per second by start_attempt; None disables the limit
+    ATTEMPT_ADMISSION_RATE = None
     # Fla settings
-    MIGRATE_DIRECTORY = 'migrations'
\ No newline at end of file
+    MIGRATE_DIRECTORY = 'migrations'
@@ -5,6 +5,8 @@ from celery import Celery
 from flask_migrate import Migrate
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import redis
+from config import Config
 
 db = SQLAlchemy()
 jwt = JWTManager()
@@ -14,3 +16,6 @@ migrate = Migrate()
 # Implementing a rate limiter, settig limit to 1000 requests per minute
 timestamp_limiter = Limiter(key_func=get_remote_address,
                             default_limits=["1000 per minute"])
+
+# Shared Redis client for data kept outside the response cache
+redis_client = redis.Redis.from_url(Config.REDIS_URL, decode_responses=True)
@@ -0,0 +1,72 @@
+import json
+import decimal
+import datetime
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def isoformat(dt: datetime.datetime) -> str:
+    # stored datetimes are naive UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _default(obj):
+    if isinstance(obj, datetime.datetime):
+        return isoformat(obj)
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(obj, sort_keys: bool = False, indent: int = None) -> bytes:
+    """
+    Encode obj as JSON the way responses are, for payloads cached already
+    encoded and returned through jsonify as is. orjson only indents by 2.
+    """
+    if orjson is not None:
+        if indent not in (None, 2):
+            raise ValueError('indent must be None or 2')
+        option = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+                  | orjson.OPT_SERIALIZE_NUMPY)
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    return json.dumps(obj, default=_default, sort_keys=sort_keys, indent=indent,
+                      separators=(',', ': ') if indent else (',', ':')).encode()
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    JSON provider encoding through orjson when installed, with datetimes
+    as UTC ISO timestamps (see isoformat), dates as ISO dates and Decimals
+    as strings. jsonify given bytes sends them as the already encoded body.
+    """
+
+    def dumps(self, obj, sort_keys: bool = False, indent: int = None, **kwargs) -> str:
+        if kwargs:
+            raise TypeError(f"Unsupported dumps arguments: {', '.join(kwargs)}")
+        return encode_json(obj, sort_keys=sort_keys, indent=indent).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            raise TypeError(f"Unsupported loads arguments: {', '.join(kwargs)}")
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s)
+
+    def response(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and isinstance(args[0], (bytes, bytearray)):
+            body = args[0]
+        else:
+            body = encode_json(self._prepare_response_obj(args, kwargs))
+        return self._app.response_class(body, mimetype='application/json')
@@ -9,7 +9,5 @@ if __name__ == '__main__':
     cli()
 
 # With this, run:
-#  $ flask db init
-#  $ flask db migrate -m "Initial migration"
 #  $ flask db upgrade
 #  $ flask seed
@@ -51,6 +51,19 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # the FTS5 search indexes and their shadow tables are created by raw DDL
+    # (see models/search.py) and are not in the metadata; keep autogenerate
+    # from dropping them
+    if type_ == 'table' and reflected and compare_to is None:
+        from models.search import SEARCH_INDEXES
+        for table in SEARCH_INDEXES:
+            fts = f"{table.name}_fts"
+            if name == fts or name.startswith(f"{fts}_"):
+                return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +78,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +107,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
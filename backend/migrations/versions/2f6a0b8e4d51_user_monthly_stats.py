@@ -0,0 +1,34 @@
+"""User monthly statistics table
+
+Revision ID: 2f6a0b8e4d51
+Revises: 8d7c3e9f0a12
+Create Date: 2026-10-18 21:15:07.640218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6a0b8e4d51'
+down_revision = '8d7c3e9f0a12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_monthly_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=7), nullable=False),
+    sa.Column('attempt_count', sa.Integer(), nullable=False),
+    sa.Column('score_sum', sa.Integer(), nullable=False),
+    sa.Column('score_min', sa.Integer(), nullable=True),
+    sa.Column('score_max', sa.Integer(), nullable=True),
+    sa.Column('time_spent_sec', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='RESTRICT'),
+    sa.PrimaryKeyConstraint('user_id', 'period')
+    )
+
+
+def downgrade():
+    op.drop_table('user_monthly_stats')
@@ -0,0 +1,37 @@
+"""Unique index on open attempts
+
+Revision ID: 5b2e8d41a7c3
+Revises: ce814a557c62
+Create Date: 2026-10-18 20:05:12.481920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8d41a7c3'
+down_revision = 'ce814a557c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Close duplicate open attempts left by racing starts, keeping the latest
+    op.execute("""
+        UPDATE attempts SET submitted_at = started_at
+        WHERE submitted_at IS NULL AND id NOT IN (
+            SELECT MAX(id) FROM attempts
+            WHERE submitted_at IS NULL
+            GROUP BY quiz_id, user_id
+        )
+    """)
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        batch_op.create_index('ix_attempts_open', ['quiz_id', 'user_id'], unique=True,
+                              sqlite_where=sa.text('submitted_at IS NULL'),
+                              postgresql_where=sa.text('submitted_at IS NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        batch_op.drop_index('ix_attempts_open')
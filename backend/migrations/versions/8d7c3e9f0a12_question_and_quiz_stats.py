@@ -0,0 +1,51 @@
+"""Question and quiz statistics tables
+
+Revision ID: 8d7c3e9f0a12
+Revises: 5b2e8d41a7c3
+Create Date: 2026-10-18 20:48:33.912054
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d7c3e9f0a12'
+down_revision = '5b2e8d41a7c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('question_stats',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('answer_count', sa.Integer(), nullable=False),
+    sa.Column('correct_count', sa.Integer(), nullable=False),
+    sa.Column('option1_count', sa.Integer(), nullable=False),
+    sa.Column('option2_count', sa.Integer(), nullable=False),
+    sa.Column('option3_count', sa.Integer(), nullable=False),
+    sa.Column('option4_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='RESTRICT'),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ondelete='RESTRICT'),
+    sa.PrimaryKeyConstraint('question_id')
+    )
+    with op.batch_alter_table('question_stats', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_question_stats_quiz_id'), ['quiz_id'], unique=False)
+
+    op.create_table('quiz_stats',
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('attempt_count', sa.Integer(), nullable=False),
+    sa.Column('score_sum', sa.Integer(), nullable=False),
+    sa.Column('possible_sum', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ondelete='RESTRICT'),
+    sa.PrimaryKeyConstraint('quiz_id')
+    )
+
+
+def downgrade():
+    op.drop_table('quiz_stats')
+    with op.batch_alter_table('question_stats', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_question_stats_quiz_id'))
+
+    op.drop_table('question_stats')
@@ -0,0 +1,132 @@
+"""Full-text search indexes for admin search
+
+Revision ID: 9e4b7c1d2a58
+Revises: 6c1f9a2d7e30
+Create Date: 2026-10-19 09:12:44.105377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7c1d2a58'
+down_revision = '6c1f9a2d7e30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite only; other databases keep the ilike search
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE subjects_fts USING fts5(name, description, content='subjects', content_rowid='id',
+                                                tokenize='unicode61 remove_diacritics 2')
+    """)
+    op.execute("""
+        CREATE TRIGGER subjects_fts_ai AFTER INSERT ON subjects BEGIN
+            INSERT INTO subjects_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER subjects_fts_ad AFTER DELETE ON subjects BEGIN
+            INSERT INTO subjects_fts(subjects_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER subjects_fts_au AFTER UPDATE OF name, description ON subjects BEGIN
+            INSERT INTO subjects_fts(subjects_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO subjects_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    """)
+    op.execute("INSERT INTO subjects_fts(subjects_fts) VALUES ('rebuild')")
+
+    op.execute("""
+        CREATE VIRTUAL TABLE users_fts USING fts5(full_name, email, content='users', content_rowid='id',
+                                                tokenize='unicode61 remove_diacritics 2')
+    """)
+    op.execute("""
+        CREATE TRIGGER users_fts_ai AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts(rowid, full_name, email) VALUES (new.id, new.full_name, new.email);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER users_fts_ad AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts(users_fts, rowid, full_name, email) VALUES ('delete', old.id, old.full_name, old.email);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER users_fts_au AFTER UPDATE OF full_name, email ON users BEGIN
+            INSERT INTO users_fts(users_fts, rowid, full_name, email) VALUES ('delete', old.id, old.full_name, old.email);
+            INSERT INTO users_fts(rowid, full_name, email) VALUES (new.id, new.full_name, new.email);
+        END
+    """)
+    op.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+
+    op.execute("""
+        CREATE VIRTUAL TABLE quizzes_fts USING fts5(title, content='quizzes', content_rowid='id',
+                                                tokenize='unicode61 remove_diacritics 2')
+    """)
+    op.execute("""
+        CREATE TRIGGER quizzes_fts_ai AFTER INSERT ON quizzes BEGIN
+            INSERT INTO quizzes_fts(rowid, title) VALUES (new.id, new.title);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER quizzes_fts_ad AFTER DELETE ON quizzes BEGIN
+            INSERT INTO quizzes_fts(quizzes_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER quizzes_fts_au AFTER UPDATE OF title ON quizzes BEGIN
+            INSERT INTO quizzes_fts(quizzes_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            INSERT INTO quizzes_fts(rowid, title) VALUES (new.id, new.title);
+        END
+    """)
+    op.execute("INSERT INTO quizzes_fts(quizzes_fts) VALUES ('rebuild')")
+
+    op.execute("""
+        CREATE VIRTUAL TABLE questions_fts USING fts5(statement, content='questions', content_rowid='id',
+                                                tokenize='unicode61 remove_diacritics 2')
+    """)
+    op.execute("""
+        CREATE TRIGGER questions_fts_ai AFTER INSERT ON questions BEGIN
+            INSERT INTO questions_fts(rowid, statement) VALUES (new.id, new.statement);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER questions_fts_ad AFTER DELETE ON questions BEGIN
+            INSERT INTO questions_fts(questions_fts, rowid, statement) VALUES ('delete', old.id, old.statement);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER questions_fts_au AFTER UPDATE OF statement ON questions BEGIN
+            INSERT INTO questions_fts(questions_fts, rowid, statement) VALUES ('delete', old.id, old.statement);
+            INSERT INTO questions_fts(rowid, statement) VALUES (new.id, new.statement);
+        END
+    """)
+    op.execute("INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER subjects_fts_ai")
+    op.execute("DROP TRIGGER subjects_fts_ad")
+    op.execute("DROP TRIGGER subjects_fts_au")
+    op.execute("DROP TABLE subjects_fts")
+    op.execute("DROP TRIGGER users_fts_ai")
+    op.execute("DROP TRIGGER users_fts_ad")
+    op.execute("DROP TRIGGER users_fts_au")
+    op.execute("DROP TABLE users_fts")
+    op.execute("DROP TRIGGER quizzes_fts_ai")
+    op.execute("DROP TRIGGER quizzes_fts_ad")
+    op.execute("DROP TRIGGER quizzes_fts_au")
+    op.execute("DROP TABLE quizzes_fts")
+    op.execute("DROP TRIGGER questions_fts_ai")
+    op.execute("DROP TRIGGER questions_fts_ad")
+    op.execute("DROP TRIGGER questions_fts_au")
+    op.execute("DROP TABLE questions_fts")
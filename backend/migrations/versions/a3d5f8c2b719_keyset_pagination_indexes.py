@@ -0,0 +1,34 @@
+"""Composite indexes for keyset pagination
+
+Revision ID: a3d5f8c2b719
+Revises: 9e4b7c1d2a58
+Create Date: 2026-10-19 11:03:27.551940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5f8c2b719'
+down_revision = '9e4b7c1d2a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.create_index('ix_subjects_live_name', ['name', 'id'], unique=False,
+                              sqlite_where=sa.text('deleted_at IS NULL'),
+                              postgresql_where=sa.text('deleted_at IS NULL'))
+
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        batch_op.create_index('ix_attempts_user_started', ['user_id', 'started_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('attempts', schema=None) as batch_op:
+        batch_op.drop_index('ix_attempts_user_started')
+
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.drop_index('ix_subjects_live_name')
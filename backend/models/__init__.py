@@ -19,4 +19,7 @@ from .chapter import Chapter
 from .quiz import Quiz
 from .question import Question
 from .attempt import Attempt
-from .answer import Answer
\ No newline at end of file
+from .answer import Answer
+from .stats import QuestionStats, QuizStats, UserMonthlyStats
+from .email import OutboundEmail
+from .search import SEARCH_INDEXES
\ No newline at end of file
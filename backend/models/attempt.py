@@ -3,6 +3,14 @@ from . import TimestampMixin
 
 class Attempt(db.Model, TimestampMixin):
     __tablename__ = 'attempts'
+    __table_args__ = (
+        # At most one open (unsubmitted) attempt per user and quiz
+        db.Index('ix_attempts_open', 'quiz_id', 'user_id', unique=True,
+                 sqlite_where=db.text('submitted_at IS NULL'),
+                 postgresql_where=db.text('submitted_at IS NULL')),
+        # Keyset pagination of a user's attempt history
+        db.Index('ix_attempts_user_started', 'user_id', 'started_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='RESTRICT'),
                         nullable=False, index=True)
@@ -0,0 +1,25 @@
+from extensions import db
+from . import TimestampMixin
+
+
+class OutboundEmail(db.Model, TimestampMixin):
+    """
+    A message in the email outbox. The dispatcher sends queued messages
+    whose next_attempt_at has passed; while a message is being sent,
+    next_attempt_at is its lease, after which another worker may retry it.
+    """
+    __tablename__ = 'outbound_emails'
+    __table_args__ = (
+        db.Index('ix_outbound_emails_due', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    attachments = db.Column(db.JSON, nullable=True)
+    # queued, sending, sent or failed
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,42 @@
+from sqlalchemy import event, DDL
+from .user import User
+from .subject import Subject
+from .quiz import Quiz
+from .question import Question
+
+# Columns of each table indexed for admin search, in SQLite FTS5
+# external-content tables named <table>_fts and kept in sync by triggers
+SEARCH_INDEXES = {
+    Subject.__table__: ('name', 'description'),
+    User.__table__: ('full_name', 'email'),
+    Quiz.__table__: ('title',),
+    Question.__table__: ('statement',),
+}
+
+
+def search_index_ddl(table: str, columns: tuple) -> list:
+    """
+    Statements creating the FTS5 index of a table and its sync triggers.
+    """
+    fts = f"{table}_fts"
+    cols = ', '.join(columns)
+    new = ', '.join(f"new.{c}" for c in columns)
+    old = ', '.join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+# create the indexes along with their tables in db.create_all()
+for _table, _columns in SEARCH_INDEXES.items():
+    for _statement in search_index_ddl(_table.name, _columns):
+        event.listen(_table, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
@@ -0,0 +1,46 @@
+from extensions import db
+
+
+class QuestionStats(db.Model):
+    """
+    Running answer counts per question, maintained when attempts are graded.
+    """
+    __tablename__ = 'question_stats'
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='RESTRICT'),
+                            primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='RESTRICT'),
+                        nullable=False, index=True)
+    answer_count = db.Column(db.Integer, nullable=False, default=0)
+    correct_count = db.Column(db.Integer, nullable=False, default=0)
+    option1_count = db.Column(db.Integer, nullable=False, default=0)
+    option2_count = db.Column(db.Integer, nullable=False, default=0)
+    option3_count = db.Column(db.Integer, nullable=False, default=0)
+    option4_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class QuizStats(db.Model):
+    """
+    Running score totals per quiz. possible_sum is the number of questions
+    each attempt was graded against, summed over attempts.
+    """
+    __tablename__ = 'quiz_stats'
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='RESTRICT'),
+                        primary_key=True)
+    attempt_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    possible_sum = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserMonthlyStats(db.Model):
+    """
+    Per-user totals of submitted attempts for each calendar month (YYYY-MM).
+    """
+    __tablename__ = 'user_monthly_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='RESTRICT'),
+                        primary_key=True)
+    period = db.Column(db.String(7), primary_key=True)
+    attempt_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    score_min = db.Column(db.Integer, nullable=True)
+    score_max = db.Column(db.Integer, nullable=True)
+    time_spent_sec = db.Column(db.Integer, nullable=False, default=0)
@@ -3,6 +3,12 @@ from . import TimestampMixin, SoftDeleteMixin
 
 class Subject(db.Model, TimestampMixin, SoftDeleteMixin):
     __tablename__ = 'subjects'
+    __table_args__ = (
+        # Keyset pagination of live subjects by name
+        db.Index('ix_subjects_live_name', 'name', 'id',
+                 sqlite_where=db.text('deleted_at IS NULL'),
+                 postgresql_where=db.text('deleted_at IS NULL')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -0,0 +1,218 @@
+import datetime
+from collections import defaultdict
+from sqlalchemy import insert, update
+from marshmallow import ValidationError, fields
+from extensions import db
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz
+from models.question import Question
+from schemas.admin import SubjectSchema, ChapterSchema, QuizSchema, QuestionSchema
+from services.answer_key_service import invalidate_answer_key
+from services.analytics_engine import bump_data_version
+
+# entity -> (model, schema, parent id field), parents before children
+ENTITIES = {
+    'subject': (Subject, SubjectSchema, None),
+    'chapter': (Chapter, ChapterSchema, 'subject_id'),
+    'quiz': (Quiz, QuizSchema, 'chapter_id'),
+    'question': (Question, QuestionSchema, 'quiz_id'),
+}
+PARENT_ENTITY = {'chapter': 'subject', 'quiz': 'chapter', 'question': 'quiz'}
+
+
+class BatchError(Exception):
+    """
+    A batch was rejected; errors lists {index, messages} per operation.
+    """
+    def __init__(self, errors: list):
+        super().__init__('Invalid batch')
+        self.errors = errors
+
+
+def _is_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith('$')
+
+
+def _is_int(value) -> bool:
+    # JSON true and false load as bools, which Python counts as ints
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_int_fields(Schema, data) -> None:
+    """
+    Reject booleans given for the integer fields of the schema.
+    """
+    if not isinstance(data, dict):
+        return
+    invalid = [name for name, field in Schema().fields.items()
+               if isinstance(field, fields.Integer) and isinstance(data.get(name), bool)]
+    if invalid:
+        raise ValidationError({name: ['Not a valid integer.'] for name in invalid})
+
+
+def _validate(operations: list) -> list:
+    """
+    Check the shape of each operation and load its data with the entity's
+    schema. A create may name its parent by the "$ref" of an earlier create
+    in the batch instead of by id. Raises BatchError listing every problem.
+    """
+    errors, loaded, refs = [], [], {}
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            errors.append({'index': index, 'messages': 'Operation must be an object'})
+            continue
+        kind, entity = op.get('op'), op.get('entity')
+        if kind not in ('create', 'update', 'delete') or entity not in ENTITIES:
+            errors.append({'index': index, 'messages': 'Unknown op or entity'})
+            continue
+        _, Schema, parent_field = ENTITIES[entity]
+        data = op.get('data') or {}
+        try:
+            _check_int_fields(Schema, data)
+            if kind == 'create':
+                parent = data.get(parent_field) if parent_field else None
+                if _is_ref(parent):
+                    if refs.get(parent) != PARENT_ENTITY[entity]:
+                        raise ValidationError({parent_field: [f'Unknown reference {parent}']})
+                    data = {k: v for k, v in data.items() if k != parent_field}
+                    data = {**Schema(partial=(parent_field,)).load(data), parent_field: parent}
+                else:
+                    data = Schema().load(data)
+                if op.get('ref') is not None:
+                    if not _is_ref(op['ref']) or op['ref'] in refs:
+                        raise ValidationError({'ref': ['Must be a new name starting with $']})
+                    refs[op['ref']] = entity
+            else:
+                if not _is_int(op.get('id')):
+                    raise ValidationError({'id': ['Missing or invalid id']})
+                if kind == 'update':
+                    exclude = (parent_field,) if parent_field else ()
+                    data = Schema(partial=True, exclude=exclude).load(data)
+                    if not data:
+                        raise ValidationError({'data': ['Nothing to update']})
+        except ValidationError as err:
+            errors.append({'index': index, 'messages': err.messages})
+            continue
+        loaded.append({'op': kind, 'entity': entity, 'id': op.get('id'),
+                       'ref': op.get('ref'), 'data': data})
+    if errors:
+        raise BatchError(errors)
+    return loaded
+
+
+def _check_exists(operations: list) -> None:
+    """
+    Every id updated, deleted or used as a parent must be a live row.
+    """
+    wanted = defaultdict(set)
+    for op in operations:
+        if op['op'] != 'create':
+            wanted[op['entity']].add(op['id'])
+        else:
+            parent_field = ENTITIES[op['entity']][2]
+            if parent_field and not _is_ref(op['data'][parent_field]):
+                wanted[PARENT_ENTITY[op['entity']]].add(op['data'][parent_field])
+    live = {}
+    for entity, ids in wanted.items():
+        Model = ENTITIES[entity][0]
+        live[entity] = {row.id for row in db.session.query(Model.id)
+                        .filter(Model.id.in_(ids), Model.deleted_at == None)}
+    errors = []
+    for index, op in enumerate(operations):
+        if op['op'] != 'create':
+            if op['id'] not in live[op['entity']]:
+                errors.append({'index': index, 'messages': {'id': ['Not found']}})
+        else:
+            parent_field = ENTITIES[op['entity']][2]
+            parent = op['data'].get(parent_field) if parent_field else None
+            if parent is not None and not _is_ref(parent) \
+                    and parent not in live[PARENT_ENTITY[op['entity']]]:
+                errors.append({'index': index, 'messages': {parent_field: ['Not found']}})
+    if errors:
+        raise BatchError(errors)
+
+
+def apply_batch(operations: list) -> dict:
+    """
+    Validate and apply a list of create/update/delete operations on
+    subjects, chapters, quizzes and questions in one transaction, with one
+    statement per entity and kind where possible. Returns the id of each
+    operation in order, the ids given to "$ref"s and the quizzes whose
+    correct options changed, to be regraded. Deletes are soft.
+    Answer keys and analytics versions are invalidated once, after the
+    commit; catalog cache tags are invalidated by the session events.
+    """
+    operations = _validate(operations)
+    _check_exists(operations)
+    key_updates = [op for op in operations if op['entity'] == 'question'
+                   and op['op'] == 'update' and 'correct_option' in op['data']]
+    old_keys = dict(db.session.query(Question.id, Question.correct_option)
+                    .filter(Question.id.in_([op['id'] for op in key_updates]))) if key_updates else {}
+
+    ids = [op['id'] for op in operations]
+    refs = {}
+    try:
+        for entity, (Model, _, parent_field) in ENTITIES.items():
+            creates = [i for i, op in enumerate(operations)
+                       if op['op'] == 'create' and op['entity'] == entity]
+            if creates:
+                rows = []
+                for i in creates:
+                    row = dict(operations[i]['data'])
+                    if parent_field and _is_ref(row[parent_field]):
+                        row[parent_field] = refs[row[parent_field]]
+                    rows.append(row)
+                # one INSERT per distinct set of columns
+                by_columns = defaultdict(list)
+                for i, row in zip(creates, rows):
+                    by_columns[tuple(sorted(row))].append((i, row))
+                for group in by_columns.values():
+                    result = db.session.execute(
+                        insert(Model).returning(Model.id, sort_by_parameter_order=True),
+                        [row for _, row in group])
+                    for (i, row), new_id in zip(group, result.scalars()):
+                        ids[i] = new_id
+                        operations[i]['data'] = {**row, 'id': new_id}
+                        if operations[i]['ref']:
+                            refs[operations[i]['ref']] = new_id
+
+            updates = [{**op['data'], 'id': op['id']} for op in operations
+                       if op['op'] == 'update' and op['entity'] == entity]
+            if updates:
+                # bulk UPDATE by primary key
+                db.session.execute(update(Model), updates)
+
+            deletes = [op['id'] for op in operations
+                       if op['op'] == 'delete' and op['entity'] == entity]
+            if deletes:
+                db.session.execute(update(Model).where(Model.id.in_(deletes))
+                                   .values(deleted_at=datetime.datetime.utcnow())
+                                   .execution_options(synchronize_session=False))
+
+        answers_changed = _affected_quizzes(operations)
+        regrade = sorted({quiz_id for quiz_id, in db.session.query(Question.quiz_id).filter(
+            Question.id.in_([op['id'] for op in key_updates
+                             if op['data']['correct_option'] != old_keys[op['id']]]))})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for quiz_id in answers_changed:
+        invalidate_answer_key(quiz_id)
+    if answers_changed:
+        bump_data_version(answers_changed)
+    return {'ids': ids, 'refs': refs, 'regrade_quiz_ids': regrade}
+
+
+def _affected_quizzes(operations: list) -> tuple:
+    """
+    Return the quizzes whose answer keys changed.
+    """
+    question_ids = [op['id'] for op in operations
+                    if op['entity'] == 'question' and op['op'] != 'create']
+    quiz_of = dict(db.session.query(Question.id, Question.quiz_id)
+                   .filter(Question.id.in_(question_ids))) if question_ids else {}
+    return sorted({op['data']['quiz_id'] if op['op'] == 'create' else quiz_of[op['id']]
+                   for op in operations if op['entity'] == 'question'})
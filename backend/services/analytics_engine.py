@@ -0,0 +1,197 @@
+import hashlib
+import numpy as np
+from sqlalchemy import select, func
+from extensions import db, cache, redis_client
+from models.attempt import Attempt
+from models.answer import Answer
+from models.question import Question
+from models.quiz import Quiz
+from models.chapter import Chapter
+
+PERCENTILES = (10, 25, 50, 75, 90)
+REPORT_TIMEOUT = 24 * 3600
+FETCH_SIZE = 10000
+
+
+# Bumped along with any quiz's version, for results computed over all of them
+_ALL_DATA_VERSION_KEY = 'analytics:version:all'
+
+
+def _data_version_key(quiz_id: int) -> str:
+    return f"analytics:version:quiz:{quiz_id}"
+
+
+def bump_data_version(quiz_ids) -> None:
+    """
+    Mark the graded data of these quizzes as changed, so cached reports
+    computed from it are no longer used.
+    """
+    quiz_ids = set(quiz_ids)
+    if not quiz_ids:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for quiz_id in quiz_ids:
+        pipe.incr(_data_version_key(quiz_id))
+    pipe.incr(_ALL_DATA_VERSION_KEY)
+    pipe.execute()
+
+
+def data_versions(quiz_ids: list = None) -> list:
+    """
+    Current graded-data version of each of these quizzes, or without
+    quiz_ids the version of all graded data.
+    """
+    keys = ([_data_version_key(q) for q in quiz_ids] if quiz_ids is not None
+            else [_ALL_DATA_VERSION_KEY])
+    return [v or '0' for v in redis_client.mget(keys)] if keys else []
+
+
+def _scope_quiz_ids(quiz_id=None, subject_id=None) -> list:
+    if quiz_id is not None:
+        return [quiz_id]
+    return [qid for (qid,) in db.session.query(Quiz.id)
+            .join(Chapter, Chapter.id == Quiz.chapter_id)
+            .filter(Chapter.subject_id == subject_id)
+            .order_by(Quiz.id)]
+
+
+def load_answer_columns(quiz_ids: list) -> dict:
+    """
+    Stream every answer of the submitted attempts of these quizzes into
+    columnar arrays: attempt_id, question_id, selected_option, correct.
+    """
+    stmt = (select(Answer.attempt_id, Answer.question_id,
+                   Answer.selected_option, Question.correct_option)
+            .join(Attempt, Attempt.id == Answer.attempt_id)
+            .join(Question, Question.id == Answer.question_id)
+            .where(Attempt.quiz_id.in_(quiz_ids), Attempt.submitted_at != None)
+            .execution_options(yield_per=FETCH_SIZE))
+    chunks = [np.array(part, dtype=np.int64).reshape(-1, 4)
+              for part in db.session.execute(stmt).partitions()]
+    data = np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.int64)
+    return {
+        'attempt_id': data[:, 0],
+        'question_id': data[:, 1],
+        'selected_option': data[:, 2],
+        'correct': (data[:, 2] == data[:, 3]).astype(np.float64),
+    }
+
+
+def load_attempt_scores(quiz_ids: list) -> np.ndarray:
+    """
+    Scores of every submitted attempt of these quizzes, including attempts
+    submitted without any answer.
+    """
+    scores = [score for (score,) in db.session.execute(
+        select(Attempt.score)
+        .where(Attempt.quiz_id.in_(quiz_ids), Attempt.submitted_at != None,
+               Attempt.score != None)
+        .execution_options(yield_per=FETCH_SIZE))]
+    return np.array(scores, dtype=np.int64)
+
+
+def max_score(quiz_ids: list) -> int:
+    """
+    Highest score possible on any of these quizzes: its number of questions.
+    """
+    counts = (select(func.count(Question.id).label('n'))
+              .where(Question.quiz_id.in_(quiz_ids), Question.deleted_at == None)
+              .group_by(Question.quiz_id).subquery())
+    return db.session.execute(select(func.max(counts.c.n))).scalar() or 0
+
+
+def score_distribution(scores: np.ndarray, top: int) -> dict:
+    """
+    Summary and histogram of attempt scores, with one bin per score from 0
+    to top (or to the highest score, if above).
+    """
+    bins = max(top, int(scores.max()) if scores.size else 0) + 1
+    counts = np.bincount(scores, minlength=bins)
+    if scores.size == 0:
+        return {'attempts': 0, 'mean': None, 'std': None, 'percentiles': {},
+                'histogram': {'bins': list(range(bins)), 'counts': counts.tolist()}}
+    return {
+        'attempts': int(scores.size),
+        'mean': float(scores.mean()),
+        'std': float(scores.std()),
+        'percentiles': {str(p): float(v) for p, v in
+                        zip(PERCENTILES, np.percentile(scores, PERCENTILES))},
+        'histogram': {'bins': list(range(counts.size)), 'counts': counts.tolist()},
+    }
+
+
+def item_analysis(columns: dict, totals: np.ndarray, attempt_idx: np.ndarray) -> list:
+    """
+    Classical item statistics per question: difficulty (share answering
+    correctly), point-biserial discrimination against the attempt total and
+    the selection rate of each option.
+    """
+    question_ids, question_idx = np.unique(columns['question_id'], return_inverse=True)
+    nq = question_ids.size
+    correct = columns['correct']
+    answer_totals = totals[attempt_idx]
+
+    answered = np.bincount(question_idx, minlength=nq).astype(np.float64)
+    right = np.bincount(question_idx, weights=correct, minlength=nq)
+    total_sum = np.bincount(question_idx, weights=answer_totals, minlength=nq)
+    right_sum = np.bincount(question_idx, weights=correct * answer_totals, minlength=nq)
+    total_sq = np.bincount(question_idx, weights=answer_totals ** 2, minlength=nq)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        difficulty = right / answered
+        wrong = answered - right
+        mean_right = right_sum / right
+        mean_wrong = (total_sum - right_sum) / wrong
+        std = np.sqrt(total_sq / answered - (total_sum / answered) ** 2)
+        discrimination = ((mean_right - mean_wrong) / std
+                          * np.sqrt(difficulty * (1 - difficulty)))
+    discrimination = np.where(np.isfinite(discrimination), discrimination, np.nan)
+
+    options = np.clip(columns['selected_option'], 1, 4) - 1
+    picks = np.bincount(question_idx * 4 + options, minlength=nq * 4).reshape(nq, 4)
+    option_rates = picks / answered[:, None]
+
+    return [{
+        'question_id': int(question_ids[i]),
+        'answered': int(answered[i]),
+        'difficulty': float(difficulty[i]),
+        'discrimination': None if np.isnan(discrimination[i]) else float(discrimination[i]),
+        'option_rates': option_rates[i].tolist(),
+    } for i in range(nq)]
+
+
+def compute_report(quiz_ids: list) -> dict:
+    columns = load_answer_columns(quiz_ids)
+    _, attempt_idx = np.unique(columns['attempt_id'], return_inverse=True)
+    totals = np.bincount(attempt_idx, weights=columns['correct'])
+    return {
+        'quiz_ids': quiz_ids,
+        'scores': score_distribution(load_attempt_scores(quiz_ids), max_score(quiz_ids)),
+        'items': item_analysis(columns, totals, attempt_idx),
+    }
+
+
+def report_versions(quiz_id=None, subject_id=None) -> list:
+    """
+    Version of the data behind the report of a quiz or a subject, one
+    "quiz_id:version" entry per quiz in scope.
+    """
+    quiz_ids = _scope_quiz_ids(quiz_id, subject_id)
+    return [f"{q}:{v}" for q, v in zip(quiz_ids, data_versions(quiz_ids))]
+
+
+def get_report(quiz_id=None, subject_id=None) -> dict:
+    """
+    Return the score distribution and item analysis of a quiz or a subject,
+    cached until any of its quizzes receives newly graded data.
+    """
+    versions = report_versions(quiz_id, subject_id)
+    quiz_ids = [int(v.split(':')[0]) for v in versions]
+    scope = f"quiz:{quiz_id}" if quiz_id is not None else f"subject:{subject_id}"
+    fingerprint = ','.join(versions)
+    key = f"analytics:report:{scope}:" + hashlib.sha1(fingerprint.encode()).hexdigest()
+    report = cache.get(key)
+    if report is None:
+        report = compute_report(quiz_ids)
+        cache.set(key, report, timeout=REPORT_TIMEOUT)
+    return report
@@ -0,0 +1,67 @@
+from extensions import db, redis_client
+from models.question import Question
+
+# Answer keys are stored per quiz version, so stale ones simply age out
+ANSWER_KEY_TTL = 24 * 3600
+
+# In-process copy of the keys: quiz_id -> (version, {question_id: correct_option})
+_local_keys = {}
+
+
+def _version_key(quiz_id: int) -> str:
+    return f"answer_key:{quiz_id}:version"
+
+
+def _answer_key(quiz_id: int, version: int) -> str:
+    return f"answer_key:{quiz_id}:v{version}"
+
+
+def build_answer_key(quiz_id: int) -> dict:
+    """
+    Load the question_id -> correct_option map of a quiz from the database.
+    """
+    rows = (db.session.query(Question.id, Question.correct_option)
+            .filter(Question.quiz_id == quiz_id, Question.deleted_at == None)
+            .all())
+    return {qid: correct for qid, correct in rows}
+
+
+def get_answer_key(quiz_id: int) -> dict:
+    """
+    Return the answer key of a quiz. The process-local copy is used while its
+    version matches the one in Redis, then the Redis copy, and the database is
+    only queried when neither is available.
+    """
+    version = int(redis_client.get(_version_key(quiz_id)) or 0)
+    local = _local_keys.get(quiz_id)
+    if local and local[0] == version:
+        return local[1]
+
+    stored = redis_client.hgetall(_answer_key(quiz_id, version))
+    if stored:
+        key = {int(qid): int(correct) for qid, correct in stored.items()}
+    else:
+        key = build_answer_key(quiz_id)
+        if key:
+            pipe = redis_client.pipeline()
+            pipe.hset(_answer_key(quiz_id, version), mapping=key)
+            pipe.expire(_answer_key(quiz_id, version), ANSWER_KEY_TTL)
+            pipe.execute()
+    _local_keys[quiz_id] = (version, key)
+    return key
+
+
+def invalidate_answer_key(quiz_id: int) -> None:
+    """
+    Bump the key version of a quiz so every process rebuilds it on next use.
+    """
+    redis_client.incr(_version_key(quiz_id))
+    _local_keys.pop(quiz_id, None)
+
+
+def grade(answer_key: dict, answers: list) -> int:
+    """
+    Count the answers whose selected_option matches the answer key.
+    """
+    return sum(1 for ans in answers
+               if answer_key.get(ans['question_id']) == ans['selected_option'])
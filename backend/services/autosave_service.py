@@ -0,0 +1,99 @@
+from sqlalchemy import insert, delete, select
+from extensions import db, redis_client
+from models.attempt import Attempt
+from models.answer import Answer
+
+DIRTY_SET = 'autosave:dirty'
+BUFFER_TTL = 24 * 3600
+
+
+def _buffer_key(attempt_id: int) -> str:
+    return f"attempt:{attempt_id}:answers"
+
+
+def save_answer(attempt_id: int, question_id: int, selected_option: int) -> None:
+    """
+    Buffer one answer of an open attempt and mark the attempt for flushing.
+    """
+    pipe = redis_client.pipeline()
+    pipe.hset(_buffer_key(attempt_id), question_id, selected_option)
+    pipe.expire(_buffer_key(attempt_id), BUFFER_TTL)
+    pipe.sadd(DIRTY_SET, attempt_id)
+    pipe.execute()
+
+
+def get_buffered_answers(attempt_id: int) -> list:
+    """
+    Return the buffered answers of an attempt as answer dicts.
+    """
+    return [{'question_id': int(qid), 'selected_option': int(option)}
+            for qid, option in redis_client.hgetall(_buffer_key(attempt_id)).items()]
+
+
+def merge_answers(attempt_id: int, answers: list) -> list:
+    """
+    Combine the buffered answers with the ones sent at submit time, the
+    latter winning for any question present in both.
+    """
+    merged = {a['question_id']: a for a in get_buffered_answers(attempt_id)}
+    merged.update({a['question_id']: a for a in answers})
+    return list(merged.values())
+
+
+def clear_buffered_answers(attempt_id: int) -> None:
+    pipe = redis_client.pipeline()
+    pipe.delete(_buffer_key(attempt_id))
+    pipe.srem(DIRTY_SET, attempt_id)
+    pipe.execute()
+
+
+def begin_attempt_writes() -> None:
+    """
+    Start the transaction that checks which attempts are still open and
+    then writes their answers. SQLite ignores FOR UPDATE, so the database
+    write lock is taken up front instead; other databases lock the attempt
+    rows selected with FOR UPDATE.
+    """
+    connection = db.session.connection()
+    # pysqlite opens its transaction at the first write; one already open
+    # holds the lock
+    if connection.dialect.name == 'sqlite' and not connection.connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def flush_buffered_answers(batch_size: int) -> int:
+    """
+    Write the buffered answers of dirty attempts to the answers table, one
+    transaction per batch of attempts, and return how many attempts were
+    flushed. Attempts submitted in the meantime are left alone.
+    """
+    flushed = 0
+    while True:
+        attempt_ids = [int(a) for a in redis_client.spop(DIRTY_SET, batch_size) or []]
+        if not attempt_ids:
+            return flushed
+
+        pipe = redis_client.pipeline()
+        for attempt_id in attempt_ids:
+            pipe.hgetall(_buffer_key(attempt_id))
+        buffers = dict(zip(attempt_ids, pipe.execute()))
+
+        # lock the attempts still open, so a submission cannot commit between
+        # this check and the writes below (persist_submissions locks them too)
+        begin_attempt_writes()
+        open_ids = [aid for (aid,) in db.session.query(Attempt.id).filter(
+            Attempt.id.in_(attempt_ids), Attempt.submitted_at == None).with_for_update()]
+        rows = [{
+            'attempt_id': aid,
+            'question_id': int(qid),
+            'selected_option': int(option)
+        } for aid in open_ids for qid, option in buffers[aid].items()]
+
+        if open_ids:
+            db.session.execute(delete(Answer).where(Answer.attempt_id.in_(
+                select(Attempt.id).where(Attempt.id.in_(open_ids),
+                                         Attempt.submitted_at == None))))
+        if rows:
+            db.session.execute(insert(Answer), rows)
+        db.session.commit()
+        flushed += len(open_ids)
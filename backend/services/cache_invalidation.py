@@ -0,0 +1,116 @@
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz
+from models.question import Question
+from services.cache_service import invalidate_tags, CATALOG_TAG
+
+# Cache tags affected by a change to a row of each catalog model
+_ROW_TAGS = {
+    Subject: lambda row: ['subjects', f"subject:{row['id']}"],
+    Chapter: lambda row: [f"subject:{row['subject_id']}", f"chapter:{row['id']}"],
+    Quiz: lambda row: [f"chapter:{row['chapter_id']}", f"quiz:{row['id']}"],
+    Question: lambda row: [f"quiz:{row['quiz_id']}"],
+}
+# Columns the row tags above are built from
+_TAG_COLUMNS = {
+    Subject: ('id',),
+    Chapter: ('id', 'subject_id'),
+    Quiz: ('id', 'chapter_id'),
+    Question: ('id', 'quiz_id'),
+}
+# Tags a bulk INSERT affects, from the parent ids in its parameters
+_INSERT_TAGS = {
+    Subject: lambda row: ['subjects'],
+    Chapter: lambda row: [f"subject:{row['subject_id']}"],
+    Quiz: lambda row: [f"chapter:{row['chapter_id']}"],
+    Question: lambda row: [f"quiz:{row['quiz_id']}"],
+}
+
+
+def _pending(session) -> set:
+    return session.info.setdefault('cache_tags', set())
+
+
+def _after_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tags = _ROW_TAGS.get(type(obj))
+        if tags is None:
+            continue
+        try:
+            _pending(session).update(tags(obj.__dict__))
+        except KeyError:
+            # the ids needed are not loaded on this object
+            _pending(session).add(CATALOG_TAG)
+
+
+def _target_tags(session, Model, criteria) -> tuple:
+    """
+    Return the ids of the rows matching criteria and their cache tags.
+    """
+    columns = [getattr(Model, name) for name in _TAG_COLUMNS[Model]]
+    rows = session.execute(select(*columns).where(criteria)).mappings().all()
+    return [row['id'] for row in rows], {tag for row in rows for tag in _ROW_TAGS[Model](row)}
+
+
+def _do_orm_execute(state):
+    """
+    Bulk INSERT/UPDATE/DELETE statements skip the flush. Inserts are tagged
+    from their parameters; updates and deletes from the rows they target,
+    found by the primary keys in their parameters or by their WHERE clause,
+    before and after the statement runs so rows moved to another parent
+    invalidate both. Only a statement without WHERE clause invalidates the
+    whole catalog.
+    """
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    mapper = state.bind_mapper
+    if mapper is None or mapper.class_ not in _ROW_TAGS:
+        return
+    Model = mapper.class_
+    params = state.parameters
+    rows = params if isinstance(params, list) else [params] if params else []
+    tags = _pending(state.session)
+    try:
+        if state.is_insert:
+            if not rows:
+                raise KeyError
+            for row in rows:
+                tags.update(_INSERT_TAGS[Model](row))
+            return
+        if rows:
+            # bulk UPDATE by primary key
+            criteria = Model.id.in_([row['id'] for row in rows])
+        elif state.statement.whereclause is not None:
+            criteria = state.statement.whereclause
+        else:
+            raise KeyError
+    except KeyError:
+        tags.add(CATALOG_TAG)
+        return
+    ids, before = _target_tags(state.session, Model, criteria)
+    result = state.invoke_statement()
+    tags.update(before, _target_tags(state.session, Model, Model.id.in_(ids))[1])
+    return result
+
+
+def _after_commit(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate_tags(tags)
+
+
+def _after_rollback(session):
+    session.info.pop('cache_tags', None)
+
+
+def register_cache_invalidation():
+    """
+    Invalidate the cache tags of catalog rows written through any session,
+    once the transaction commits.
+    """
+    for name, fn in (('after_flush', _after_flush), ('do_orm_execute', _do_orm_execute),
+                     ('after_commit', _after_commit), ('after_rollback', _after_rollback)):
+        if not event.contains(Session, name, fn):
+            event.listen(Session, name, fn)
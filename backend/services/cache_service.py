@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import threading
+from config import Config
+from redis.exceptions import LockError
+from extensions import cache, redis_client
+from services.local_cache import LocalCache
+
+# Tag shared by every tagged entry, for changes too broad to pin down
+CATALOG_TAG = 'catalog'
+# Channel on which invalidated tags are announced to every worker
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+# In-process first tier, in front of the shared Redis cache
+local_cache = LocalCache(Config.LOCAL_CACHE_MAX_BYTES)
+# Tag versions known to this process, as (version, expires_at); only trusted
+# while subscribed to invalidations, and re-read after TAG_VERSION_TTL in case
+# a read raced with an invalidation
+TAG_VERSION_TTL = 5
+_tag_versions = {}
+_subscriber = {'pid': None, 'thread': None}
+_subscriber_lock = threading.Lock()
+
+# How long a rebuild may hold the lock, and how long other workers wait for it
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT = 5
+REBUILD_POLL_INTERVAL = 0.05
+# A build that found nothing is remembered this long, so waiters and later
+# readers of a missing entry do not rebuild it each time
+NEGATIVE_TIMEOUT = 10
+_NOTHING = '<cache:nothing>'
+
+
+def get_or_build(key: str, builder, timeout: int, local_timeout: int = None):
+    """
+    Return the cached value for key, building it on a miss. Only one worker
+    runs builder for a given key at a time; the others wait for its result
+    instead of hitting the database as well. A None result is only cached
+    for NEGATIVE_TIMEOUT. With local_timeout, the value is also kept in this
+    process's LRU for that long, sparing the Redis round trip on hot keys.
+    """
+    if local_timeout:
+        value = local_cache.get(key)
+        if value is not None:
+            return value
+    value = _get_shared(key, builder, timeout)
+    if local_timeout and value is not None:
+        local_cache.set(key, value, min(local_timeout, timeout))
+    return value
+
+
+def _get_shared(key: str, builder, timeout: int):
+    value = cache.get(key)
+    if value is not None:
+        return None if value == _NOTHING else value
+
+    lock = redis_client.lock(f"rebuild:{key}", timeout=REBUILD_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        deadline = time.monotonic() + REBUILD_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(REBUILD_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return None if value == _NOTHING else value
+        # the rebuilding worker is stuck or gone; build it ourselves
+        return builder()
+
+    try:
+        value = builder()
+        if value is None:
+            cache.set(key, _NOTHING, timeout=min(NEGATIVE_TIMEOUT, timeout))
+        else:
+            cache.set(key, value, timeout=timeout)
+        return value
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # the build outlived REBUILD_LOCK_TIMEOUT and the lock expired
+            pass
+
+
+def _tag_version_key(tag: str) -> str:
+    return f"cachetag:{tag}"
+
+
+def tagged_key(base: str, tags: list) -> str:
+    """
+    Cache key of an entry depending on tags: it embeds the current version
+    of each tag (and of CATALOG_TAG), so invalidating a tag moves readers
+    to a fresh key and the old entry just expires.
+    """
+    tags = [CATALOG_TAG, *tags]
+    return f"{base}@{'.'.join(_tag_versions_of(tags))}"
+
+
+def tag_versions(tags: list) -> list:
+    """
+    Current version of each tag, as used in tagged keys.
+    """
+    return _tag_versions_of(list(tags))
+
+
+def _tag_versions_of(tags: list) -> list:
+    if not _ensure_subscribed():
+        return [v or '0' for v in redis_client.mget([_tag_version_key(t) for t in tags])]
+    now = time.monotonic()
+    known = {t: _tag_versions.get(t) for t in tags}
+    missing = [t for t, v in known.items() if v is None or v[1] < now]
+    if missing:
+        versions = redis_client.mget([_tag_version_key(t) for t in missing])
+        for tag, version in zip(missing, versions):
+            known[tag] = _tag_versions[tag] = (version or '0', now + TAG_VERSION_TTL)
+    return [known[t][0] for t in tags]
+
+
+def _on_invalidation(message) -> None:
+    for tag in json.loads(message['data']):
+        _tag_versions.pop(tag, None)
+
+
+def _ensure_subscribed() -> bool:
+    """
+    Start this process's listener for tag invalidations if needed, and
+    tell whether locally known tag versions can be trusted.
+    """
+    thread = _subscriber['thread']
+    if _subscriber['pid'] == os.getpid() and thread is not None and thread.is_alive():
+        return True
+    with _subscriber_lock:
+        if _subscriber['pid'] != os.getpid() or not (thread and thread.is_alive()):
+            # versions learned before (re)subscribing may have missed messages
+            _tag_versions.clear()
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidation})
+                _subscriber['thread'] = pubsub.run_in_thread(sleep_time=1, daemon=True)
+                _subscriber['pid'] = os.getpid()
+            except Exception:
+                return False
+    return False
+
+
+def invalidate_tags(tags) -> None:
+    tags = sorted(set(tags))
+    pipe = redis_client.pipeline(transaction=False)
+    for tag in tags:
+        pipe.incr(_tag_version_key(tag))
+    pipe.publish(INVALIDATION_CHANNEL, json.dumps(tags))
+    pipe.execute()
+    for tag in tags:
+        _tag_versions.pop(tag, None)
+
+
+def cache_stats() -> dict:
+    """
+    Counters of this process's local cache tier.
+    """
+    return {**local_cache.stats(), 'known_tags': len(_tag_versions),
+            'subscribed': _ensure_subscribed()}
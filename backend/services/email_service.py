@@ -1,6 +1,11 @@
 import smtplib
 import os
+import time
+import datetime
 from email.message import EmailMessage
+from sqlalchemy import insert, update
+from extensions import db, redis_client
+from models.email import OutboundEmail
 
 SMTP_HOST = os.getenv('SMTP_HOST', 'localhost')
 SMTP_PORT = int(os.getenv('SMTP_PORT', 25))
@@ -8,11 +13,30 @@ SMTP_USER = os.getenv('SMTP_USER', '')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
 FROM_EMAIL = os.getenv('FROM_EMAIL', 'no-reply@example.com')
 
+# Seconds a claimed message stays leased to the dispatcher that claimed it
+SEND_LEASE_SEC = 300
+# A pooled connection idle this many seconds is probed with NOOP before use
+SMTP_IDLE_PROBE_SEC = 30
+# Next free send slot, shared by every dispatcher so EMAIL_SEND_RATE holds overall
+SEND_SLOT_KEY = 'email:send_slot'
 
-def send_email(to: str, subject: str, body: str, attachments: list = None):
-    """
-    Send an email with optional attachments.
-    """
+# Reserves the next send slot ARGV[1] seconds after the previous one and
+# returns how long to wait for it, by the Redis clock
+_RESERVE_SLOT = redis_client.register_script("""
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local slot = math.max(now, tonumber(redis.call('GET', KEYS[1]) or '0'))
+local interval = tonumber(ARGV[1])
+redis.call('SET', KEYS[1], tostring(slot + interval),
+           'PX', math.ceil((slot + interval - now) * 1000) + 1000)
+return tostring(slot - now)
+""")
+
+_smtp = None
+_smtp_used_at = 0.0
+
+
+def build_message(to: str, subject: str, body: str, attachments: list = None) -> EmailMessage:
     msg = EmailMessage()
     msg['Subject'] = subject
     msg['From'] = FROM_EMAIL
@@ -27,8 +51,152 @@ def send_email(to: str, subject: str, body: str, attachments: list = None):
             maintype, subtype = 'application', 'octet-stream'
             filename = os.path.basename(file_path)
             msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+    return msg
+
+
+def _connection() -> smtplib.SMTP:
+    """
+    Return this process's SMTP connection, reconnecting (and logging in
+    again) when it is missing or, after SMTP_IDLE_PROBE_SEC idle, fails a
+    NOOP. A connection dropped while in use is handled by _send.
+    """
+    global _smtp
+    if _smtp is not None:
+        if time.monotonic() - _smtp_used_at < SMTP_IDLE_PROBE_SEC:
+            return _smtp
+        try:
+            _smtp.noop()
+            return _smtp
+        except smtplib.SMTPException:
+            close_connection()
+    _smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+    if SMTP_USER and SMTP_PASSWORD:
+        _smtp.login(SMTP_USER, SMTP_PASSWORD)
+    return _smtp
+
+
+def close_connection():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except OSError:
+            pass
+        _smtp = None
+
+
+def _send(msg: EmailMessage) -> None:
+    """
+    Send msg on the pooled connection, reconnecting once if the server
+    dropped it.
+    """
+    global _smtp_used_at
+    try:
+        _connection().send_message(msg)
+    except smtplib.SMTPServerDisconnected:
+        close_connection()
+        _connection().send_message(msg)
+    _smtp_used_at = time.monotonic()
+
+
+def send_email(to: str, subject: str, body: str, attachments: list = None):
+    """
+    Send an email with optional attachments right away, on the pooled connection.
+    """
+    _send(build_message(to, subject, body, attachments))
+
+
+def queue_emails(messages: list) -> None:
+    """
+    Add messages to the outbox in one insert. Each message is a dict with
+    to, subject, body and optionally attachments (file paths).
+    """
+    if not messages:
+        return
+    now = datetime.datetime.utcnow()
+    db.session.execute(insert(OutboundEmail), [{
+        'recipient': m['to'],
+        'subject': m['subject'],
+        'body': m['body'],
+        'attachments': m.get('attachments'),
+        'status': 'queued',
+        'attempts': 0,
+        'next_attempt_at': now,
+    } for m in messages])
+    db.session.commit()
+
+
+def queue_email(to: str, subject: str, body: str, attachments: list = None) -> None:
+    queue_emails([{'to': to, 'subject': subject, 'body': body, 'attachments': attachments}])
+
+
+def _claim_due(batch_size: int) -> list:
+    """
+    Lease up to batch_size due messages to this dispatcher. Messages left in
+    'sending' by a dispatcher that died are due again once their lease ends.
+    """
+    now = datetime.datetime.utcnow()
+    ids = [row.id for row in db.session.query(OutboundEmail.id)
+           .filter(OutboundEmail.status.in_(('queued', 'sending')),
+                   OutboundEmail.next_attempt_at <= now)
+           .order_by(OutboundEmail.next_attempt_at)
+           .limit(batch_size)]
+    if not ids:
+        return []
+    lease_until = now + datetime.timedelta(seconds=SEND_LEASE_SEC)
+    # the re-check of the due condition makes the claim safe against another dispatcher
+    db.session.execute(
+        update(OutboundEmail)
+        .where(OutboundEmail.id.in_(ids),
+               OutboundEmail.status.in_(('queued', 'sending')),
+               OutboundEmail.next_attempt_at <= now)
+        .values(status='sending', next_attempt_at=lease_until)
+        .execution_options(synchronize_session=False))
+    db.session.commit()
+    return (OutboundEmail.query
+            .filter(OutboundEmail.id.in_(ids), OutboundEmail.next_attempt_at == lease_until)
+            .all())
+
+
+def dispatch_outbox(batch_size: int, rate: float, max_attempts: int, retry_base_sec: int) -> dict:
+    """
+    Send a batch of due outbox messages over one SMTP connection, at most
+    `rate` messages per second across all dispatchers. Failures are retried with exponential backoff
+    until max_attempts; recipients the server refuses fail immediately.
+    Returns counts of sent, retried and failed messages.
+    """
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+    interval = 1.0 / rate if rate else 0
+    for email in _claim_due(batch_size):
+        if interval:
+            delay = float(_RESERVE_SLOT(keys=[SEND_SLOT_KEY], args=[interval]))
+            if delay > 0:
+                time.sleep(delay)
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-        if SMTP_USER and SMTP_PASSWORD:
-            smtp.login(SMTP_USER, SMTP_PASSWORD)
-        smtp.send_message(msg)
\ No newline at end of file
+        email.attempts += 1
+        try:
+            _send(build_message(email.recipient, email.subject, email.body, email.attachments))
+        except Exception as exc:
+            # SMTP errors are OSErrors too; refused recipients and missing
+            # attachments won't succeed on retry. Anything else (a header
+            # that cannot be encoded, say) is retried up to max_attempts,
+            # on a fresh connection since this one may be mid-transaction.
+            if isinstance(exc, smtplib.SMTPServerDisconnected) or not isinstance(exc, OSError):
+                close_connection()
+            email.last_error = str(exc)[:1000]
+            permanent = isinstance(exc, (smtplib.SMTPRecipientsRefused, FileNotFoundError))
+            if permanent or email.attempts >= max_attempts:
+                email.status = 'failed'
+                counts['failed'] += 1
+            else:
+                email.status = 'queued'
+                email.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(
+                    seconds=retry_base_sec * 2 ** (email.attempts - 1))
+                counts['retried'] += 1
+        else:
+            email.status = 'sent'
+            email.sent_at = datetime.datetime.utcnow()
+            email.last_error = None
+            counts['sent'] += 1
+        db.session.commit()
+    return counts
@@ -0,0 +1,49 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+from services.cache_service import tag_versions, CATALOG_TAG
+from services.submission_service import attempts_tag
+
+
+def catalog_versions(*tags) -> list:
+    return tag_versions([CATALOG_TAG, *tags])
+
+
+def attempts_versions(user_id) -> list:
+    return tag_versions([attempts_tag(user_id)])
+
+
+def content_etag(versions: list) -> str:
+    """
+    Strong ETag of the response to the current request, derived from the
+    versions of the stored content it is built from. The URL and the
+    caller are part of it, so it never matches another page or user.
+    """
+    scope = f"{request.full_path}|{get_jwt_identity()}|{'.'.join(map(str, versions))}"
+    return hashlib.sha1(scope.encode()).hexdigest()
+
+
+def conditional(versions):
+    """
+    Let a GET view answer If-None-Match with 304 before it builds anything.
+    versions is called with the view arguments and returns the versions of
+    the content the response depends on; successful responses carry the
+    matching ETag and must be revalidated before reuse.
+    Apply it below jwt_required.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = content_etag(versions(**kwargs))
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
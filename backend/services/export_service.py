@@ -1,6 +1,11 @@
 import csv
+import hashlib
+import io
 import os
 import uuid
+import zlib
+from flask import Response, request, stream_with_context
+from sqlalchemy import select, func
 from models.attempt import Attempt
 from models.quiz import Quiz
 from extensions import db
@@ -9,40 +14,163 @@ EXPORT_DIR = os.path.join(os.getcwd(), 'exports')
 if not os.path.exists(EXPORT_DIR):
     os.makedirs(EXPORT_DIR)
 
-def generate_attempts_csv(user_id: int) -> str:
+# Rows fetched from the database cursor and encoded per CSV chunk
+EXPORT_BATCH_SIZE = 1000
+
+ATTEMPTS_HEADER = ['attempt_id', 'quiz_id', 'score', 'submitted_at']
+QUIZZES_HEADER = ['quiz_id', 'title', 'chapter_id', 'duration_min', 'scheduled_at']
+
+
+def _iter_csv(header: list, stmt, batch_size: int):
     """
-    Generate a CSV of all attempts for a given user and return the file path.
+    Yield a CSV document as text chunks, one per batch of rows read from a
+    server-side cursor, so memory use does not grow with the result size.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_attempts_csv(user_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Stream the CSV of all attempts for a given user.
+    """
+    stmt = (select(Attempt.id, Attempt.quiz_id, Attempt.score, Attempt.submitted_at)
+            .where(Attempt.user_id == user_id)
+            .order_by(Attempt.submitted_at))
+    return _iter_csv(ATTEMPTS_HEADER, stmt, batch_size)
+
+
+def iter_all_quizzes_csv(batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Stream the CSV of all quizzes.
+    """
+    stmt = (select(Quiz.id, Quiz.title, Quiz.chapter_id, Quiz.duration_min,
+                   Quiz.scheduled_at)
+            .order_by(Quiz.id))
+    return _iter_csv(QUIZZES_HEADER, stmt, batch_size)
+
+
+def gzip_chunks(chunks):
+    """
+    Gzip a stream of text chunks on the fly.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(chunks, filename: str) -> Response:
+    """
+    Send CSV chunks as a chunked download, gzipped when the client accepts it.
+    """
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(chunks), mimetype='text/csv', headers=headers)
+
+
+def attempts_fingerprint(user_id: int) -> str:
+    """
+    Identify the current content of a user's attempts export: it changes
+    whenever an attempt of the user is added or updated.
+    """
+    count, last_update = db.session.execute(
+        select(func.count(Attempt.id), func.max(Attempt.updated_at))
+        .where(Attempt.user_id == user_id)).one()
+    return _fingerprint('attempts', user_id, count, last_update)
+
+
+def quizzes_fingerprint() -> str:
+    """
+    Identify the current content of the all-quizzes export.
+    """
+    count, last_update = db.session.execute(
+        select(func.count(Quiz.id), func.max(Quiz.updated_at))).one()
+    return _fingerprint('quizzes', count, last_update)
+
+
+def _fingerprint(*parts) -> str:
+    return hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def attempts_export_filename(user_id: int, fingerprint: str) -> str:
+    return f"attempts_{user_id}_{fingerprint}.csv"
+
+
+def quizzes_export_filename(fingerprint: str) -> str:
+    return f"all_quizzes_{fingerprint}.csv"
+
+
+def find_export(filename: str):
+    """
+    Return the path of an already generated export, marking it as recently
+    used for the retention sweep, or None if it does not exist.
     """
-    filename = f"attempts_{user_id}_{uuid.uuid4().hex}.csv"
     filepath = os.path.join(EXPORT_DIR, filename)
+    if not os.path.exists(filepath):
+        return None
+    os.utime(filepath)
+    return filepath
 
-    attempts = (
-        db.session.query(Attempt)
-        .filter_by(user_id=user_id)
-        .order_by(Attempt.submitted_at)
-        .all()
-    )
-    with open(filepath, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['attempt_id','quiz_id','score','submitted_at'])
-        for a in attempts:
-            writer.writerow([a.id, a.quiz_id, a.score, a.submitted_at])
 
+def _write_csv(filepath: str, chunks) -> None:
+    # write under a temporary name so readers never see a partial export
+    tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', newline='') as csvfile:
+        for chunk in chunks:
+            csvfile.write(chunk)
+    os.replace(tmp_path, filepath)
+
+
+def generate_attempts_csv(user_id: int, fingerprint: str = None) -> str:
+    """
+    Generate a CSV of all attempts for a given user and return the file path.
+    """
+    filename = attempts_export_filename(user_id, fingerprint or uuid.uuid4().hex)
+    filepath = os.path.join(EXPORT_DIR, filename)
+    _write_csv(filepath, iter_attempts_csv(user_id))
     return filepath
 
-def generate_all_quizzes_csv() -> str:
+def generate_all_quizzes_csv(fingerprint: str = None) -> str:
     """
     Generate a CSV of all quizzes and return the file path.
     """
-    filename = f"all_quizzes_{uuid.uuid4().hex}.csv"
+    filename = quizzes_export_filename(fingerprint or uuid.uuid4().hex)
     filepath = os.path.join(EXPORT_DIR, filename)
+    _write_csv(filepath, iter_all_quizzes_csv())
+    return filepath
 
-    quizzes = db.session.query(Quiz).all()
-    
-    with open(filepath, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['quiz_id', 'title', 'chapter_id', 'duration_min', 'scheduled_at'])
-        for q in quizzes:
-            writer.writerow([q.id, q.title, q.chapter_id, q.duration_min, q.scheduled_at])
 
-    return filepath
\ No newline at end of file
+def sweep_exports(max_bytes: int) -> list:
+    """
+    Delete the least recently used exports until the directory fits in
+    max_bytes, and return the names of the deleted files.
+    """
+    entries = []
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+    total = sum(size for _, size, _, _ in entries)
+    deleted = []
+    for _, size, path, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        deleted.append(name)
+    return deleted
@@ -0,0 +1,196 @@
+import csv
+import io
+from sqlalchemy import insert
+from marshmallow import ValidationError
+from extensions import db
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz
+from models.question import Question
+from schemas.admin import SubjectSchema, ChapterSchema, QuizSchema, QuestionSchema
+from services.answer_key_service import invalidate_answer_key
+from services.analytics_engine import bump_data_version
+
+QUESTION_INSERT_CHUNK = 5000
+
+CSV_COLUMNS = ['subject', 'subject_description', 'chapter', 'chapter_description',
+               'quiz', 'duration_min', 'scheduled_at', 'statement',
+               'option1', 'option2', 'option3', 'option4', 'correct_option']
+
+
+def rows_from_tree(subjects: list) -> list:
+    """
+    Flatten a subject -> chapters -> quizzes -> questions tree (the
+    seed_data.json layout) into one row per question.
+    """
+    rows = []
+    for subj in subjects:
+        for chap in subj.get('chapters', []):
+            for quiz in chap.get('quizzes', []):
+                for q in quiz.get('questions', []):
+                    options = list(q.get('options') or [])
+                    options += [None] * (4 - len(options))
+                    rows.append({
+                        'subject': subj.get('name'),
+                        'subject_description': subj.get('description'),
+                        'chapter': chap.get('name'),
+                        'chapter_description': chap.get('description'),
+                        'quiz': quiz.get('title'),
+                        'duration_min': quiz.get('duration_min'),
+                        'scheduled_at': quiz.get('scheduled_at'),
+                        'statement': q.get('statement'),
+                        'option1': options[0],
+                        'option2': options[1],
+                        'option3': options[2],
+                        'option4': options[3],
+                        'correct_option': q.get('correct_option'),
+                    })
+    return rows
+
+
+def rows_from_csv(text: str) -> list:
+    """
+    Read question rows from a CSV with a CSV_COLUMNS header.
+    """
+    return [{col: (row.get(col) or None) for col in CSV_COLUMNS}
+            for row in csv.DictReader(io.StringIO(text))]
+
+
+def _present(data: dict) -> dict:
+    return {k: v for k, v in data.items() if v is not None}
+
+
+def _validate(schema, items: dict, errors: dict, rows_of: dict) -> dict:
+    """
+    Validate the unique items of one level in a single schema call and
+    return the valid ones; errors are reported on every row using the item.
+    """
+    keys = list(items)
+    try:
+        loaded = schema.load([items[k] for k in keys])
+        return dict(zip(keys, loaded))
+    except ValidationError as err:
+        for i, msgs in err.messages.items():
+            for row in rows_of[keys[i]]:
+                errors.setdefault(row, {}).update(msgs)
+        keys = [k for i, k in enumerate(keys) if i not in err.messages]
+        return dict(zip(keys, schema.load([items[k] for k in keys])))
+
+
+def import_question_bank(rows: list) -> dict:
+    """
+    Create the subjects, chapters, quizzes and questions described by the
+    rows in one transaction, with batched inserts. Entities are matched by
+    name/title/statement under their parent, so re-importing the same bank
+    creates nothing new. Returns counts and per-row validation errors.
+    """
+    errors = {}
+    subjects, chapters, quizzes, questions = {}, {}, {}, {}
+    rows_of = {}
+    for i, row in enumerate(rows):
+        s_key = row.get('subject')
+        c_key = (s_key, row.get('chapter'))
+        z_key = (*c_key, row.get('quiz'))
+        q_key = (*z_key, row.get('statement'))
+        subjects.setdefault(s_key, _present({
+            'name': row.get('subject'), 'description': row.get('subject_description')}))
+        chapters.setdefault(c_key, _present({
+            'name': row.get('chapter'), 'description': row.get('chapter_description')}))
+        quizzes.setdefault(z_key, _present({
+            'title': row.get('quiz'), 'duration_min': row.get('duration_min'),
+            'scheduled_at': row.get('scheduled_at')}))
+        questions.setdefault(q_key, _present({
+            k: row.get(k) for k in ('statement', 'option1', 'option2', 'option3',
+                                    'option4', 'correct_option')}))
+        for key in (s_key, c_key, z_key, q_key):
+            rows_of.setdefault(key, []).append(i)
+
+    subjects = _validate(SubjectSchema(many=True), subjects, errors, rows_of)
+    chapters = _validate(ChapterSchema(many=True, partial=('subject_id',)),
+                         chapters, errors, rows_of)
+    quizzes = _validate(QuizSchema(many=True, partial=('chapter_id',)),
+                        quizzes, errors, rows_of)
+    questions = _validate(QuestionSchema(many=True, partial=('quiz_id',)),
+                          questions, errors, rows_of)
+
+    # build a parent only for valid questions whose whole lineage is valid,
+    # so an invalid row does not leave empty subjects, chapters or quizzes
+    questions = {key: data for key, data in questions.items()
+                 if key[:3] in quizzes and key[:2] in chapters and key[0] in subjects}
+    quizzes = {key: data for key, data in quizzes.items()
+               if key in {q_key[:3] for q_key in questions}}
+    chapters = {key: data for key, data in chapters.items()
+                if key in {z_key[:2] for z_key in quizzes}}
+    subjects = {key: data for key, data in subjects.items()
+                if key in {c_key[0] for c_key in chapters}}
+
+    # resolve parents in memory: existing rows first, then batch-insert the rest
+    subject_ids = {name: sid for sid, name in db.session.query(Subject.id, Subject.name)
+                   .filter(Subject.deleted_at == None)}
+    created = {'subjects': 0, 'chapters': 0, 'quizzes': 0, 'questions': 0}
+    new = [dict(data) for key, data in subjects.items() if key not in subject_ids]
+    if new:
+        for sid, name in db.session.execute(
+                insert(Subject).returning(Subject.id, Subject.name,
+                                          sort_by_parameter_order=True), new):
+            subject_ids[name] = sid
+        created['subjects'] = len(new)
+
+    chapter_ids = {(sid, name): cid for cid, sid, name in
+                   db.session.query(Chapter.id, Chapter.subject_id, Chapter.name)
+                   .filter(Chapter.deleted_at == None,
+                           Chapter.subject_id.in_(list(subject_ids.values())))}
+    new = []
+    for (s_key, name), data in chapters.items():
+        sid = subject_ids.get(s_key)
+        if sid is not None and (sid, name) not in chapter_ids:
+            new.append({**data, 'subject_id': sid})
+    if new:
+        for cid, sid, name in db.session.execute(
+                insert(Chapter).returning(Chapter.id, Chapter.subject_id, Chapter.name,
+                                          sort_by_parameter_order=True), new):
+            chapter_ids[(sid, name)] = cid
+        created['chapters'] = len(new)
+
+    def chapter_id(s_key, c_name):
+        return chapter_ids.get((subject_ids.get(s_key), c_name))
+
+    quiz_ids = {(cid, title): zid for zid, cid, title in
+                db.session.query(Quiz.id, Quiz.chapter_id, Quiz.title)
+                .filter(Quiz.deleted_at == None,
+                        Quiz.chapter_id.in_(list(chapter_ids.values())))}
+    new = []
+    for (s_key, c_name, title), data in quizzes.items():
+        cid = chapter_id(s_key, c_name)
+        if cid is not None and (cid, title) not in quiz_ids:
+            new.append({'scheduled_at': None, **data, 'chapter_id': cid})
+    if new:
+        for zid, cid, title in db.session.execute(
+                insert(Quiz).returning(Quiz.id, Quiz.chapter_id, Quiz.title,
+                                       sort_by_parameter_order=True), new):
+            quiz_ids[(cid, title)] = zid
+        created['quizzes'] = len(new)
+
+    existing = set(db.session.query(Question.quiz_id, Question.statement)
+                   .filter(Question.deleted_at == None,
+                           Question.quiz_id.in_(list(quiz_ids.values()))))
+    new = []
+    for (s_key, c_name, title, statement), data in questions.items():
+        zid = quiz_ids.get((chapter_id(s_key, c_name), title))
+        if zid is not None and (zid, statement) not in existing:
+            new.append({**data, 'quiz_id': zid})
+    for i in range(0, len(new), QUESTION_INSERT_CHUNK):
+        db.session.execute(insert(Question), new[i:i + QUESTION_INSERT_CHUNK])
+    created['questions'] = len(new)
+
+    db.session.commit()
+    touched = sorted({q['quiz_id'] for q in new})
+    for quiz_id in touched:
+        invalidate_answer_key(quiz_id)
+    if touched:
+        bump_data_version(touched)
+    return {
+        'created': created,
+        'rows': len(rows),
+        'errors': [{'row': row, 'messages': msgs} for row, msgs in sorted(errors.items())]
+    }
@@ -0,0 +1,209 @@
+from collections import defaultdict
+from extensions import db, redis_client
+from models.attempt import Attempt
+
+GLOBAL_BOARD = 'global'
+
+# Adds one score to a user's running sum/count and re-ranks them by average
+_ADD_SCORE = redis_client.register_script("""
+local total = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+local count = redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+redis.call('ZADD', KEYS[3], total / count, ARGV[1])
+return count
+""")
+
+# Moves a user's running sum by a score change and re-ranks them
+_ADJUST_SCORE = redis_client.register_script("""
+local total = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+local count = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+if count > 0 then
+    redis.call('ZADD', KEYS[3], total / count, ARGV[1])
+end
+return total
+""")
+
+
+def _board_keys(board: str) -> list:
+    return [f"leaderboard:{board}:sum", f"leaderboard:{board}:count",
+            f"leaderboard:{board}:rank"]
+
+
+def _quiz_key(quiz_id: int) -> str:
+    return f"leaderboard:quiz:{quiz_id}"
+
+
+def month_board(submitted_at) -> str:
+    return f"month:{submitted_at:%Y-%m}"
+
+
+def _quiz_member_score(score: int, submitted_at) -> float:
+    # higher score first, earlier submission first on ties
+    return score * 1e10 - submitted_at.timestamp()
+
+
+def record_scores(attempts: list) -> None:
+    """
+    Add graded attempts to the global, monthly and per-quiz rankings. Each
+    attempt is a dict with attempt_id, user_id, quiz_id, score, submitted_at.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for a in attempts:
+        if a['score'] is None:
+            continue
+        for board in (GLOBAL_BOARD, month_board(a['submitted_at'])):
+            _ADD_SCORE(keys=_board_keys(board), args=[a['user_id'], a['score']],
+                       client=pipe)
+        pipe.zadd(_quiz_key(a['quiz_id']), {
+            f"{a['attempt_id']}:{a['user_id']}":
+            _quiz_member_score(a['score'], a['submitted_at'])
+        })
+    pipe.execute()
+
+
+def adjust_scores(attempts: list) -> None:
+    """
+    Apply regraded scores to the rankings. Each attempt is a dict with
+    attempt_id, user_id, quiz_id, old_score, score and submitted_at.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for a in attempts:
+        delta = a['score'] - a['old_score']
+        if not delta:
+            continue
+        for board in (GLOBAL_BOARD, month_board(a['submitted_at'])):
+            _ADJUST_SCORE(keys=_board_keys(board), args=[a['user_id'], delta], client=pipe)
+        pipe.zadd(_quiz_key(a['quiz_id']), {
+            f"{a['attempt_id']}:{a['user_id']}":
+            _quiz_member_score(a['score'], a['submitted_at'])
+        })
+    pipe.execute()
+
+
+def get_user_rank(user_id: int, board: str = GLOBAL_BOARD):
+    """
+    Return (ranking, total_users) of a user by average score on a board,
+    ranking being None if the user has no graded attempt there.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrevrank(_board_keys(board)[2], user_id)
+    pipe.zcard(_board_keys(board)[2])
+    rank, total = pipe.execute()
+    return (rank + 1 if rank is not None else None), total
+
+
+def get_user_average(user_id: int, board: str = GLOBAL_BOARD) -> float:
+    sum_key, count_key, _ = _board_keys(board)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hget(sum_key, user_id)
+    pipe.hget(count_key, user_id)
+    total, count = pipe.execute()
+    return int(total) / int(count) if count else 0
+
+
+def _zset_page(key: str, limit: int, after: list = None) -> tuple:
+    """
+    Page through a sorted set from the highest score, resuming strictly
+    after the (score, member) position `after`. Returns the (member, score)
+    pairs and the position to resume from, or None on the last page.
+    """
+    if after is None:
+        entries = redis_client.zrevrange(key, 0, limit, withscores=True)
+    else:
+        score, member = float(after[0]), str(after[1])
+        # members tied on the cursor's score come back in reverse member order
+        ties = redis_client.zcount(key, score, score)
+        entries = redis_client.zrevrangebyscore(key, score, '-inf', start=0,
+                                                num=limit + ties + 1, withscores=True)
+        entries = [(m, v) for m, v in entries if v < score or m < member][:limit + 1]
+    if len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    return entries, list(entries[-1][::-1])
+
+
+def get_quiz_top(quiz_id: int, n: int, after: list = None) -> tuple:
+    """
+    Return the n best attempts of a quiz after position `after` as
+    (attempt_id, user_id, score) tuples, with the position of the next page.
+    """
+    entries, next_after = _zset_page(_quiz_key(quiz_id), n, after)
+    result = []
+    for member, value in entries:
+        attempt_id, user_id = member.split(':')
+        result.append((int(attempt_id), int(user_id), int(round(value / 1e10))))
+    return result, next_after
+
+
+def get_board_page(board: str, n: int, after: list = None) -> tuple:
+    """
+    Return the n users after position `after` on a board, best average
+    first, as (user_id, average) tuples, with the position of the next page.
+    """
+    entries, next_after = _zset_page(_board_keys(board)[2], n, after)
+    return [(int(member), value) for member, value in entries], next_after
+
+
+def _load_from_sql():
+    totals = defaultdict(lambda: defaultdict(int))
+    counts = defaultdict(lambda: defaultdict(int))
+    quizzes = defaultdict(dict)
+    rows = (db.session.query(Attempt.id, Attempt.user_id, Attempt.quiz_id,
+                             Attempt.score, Attempt.submitted_at)
+            .filter(Attempt.submitted_at != None, Attempt.score != None)
+            .yield_per(5000))
+    for attempt_id, user_id, quiz_id, score, submitted_at in rows:
+        for board in (GLOBAL_BOARD, month_board(submitted_at)):
+            totals[board][user_id] += score
+            counts[board][user_id] += 1
+        quizzes[quiz_id][f"{attempt_id}:{user_id}"] = \
+            _quiz_member_score(score, submitted_at)
+    return totals, counts, quizzes
+
+
+def rebuild_leaderboards() -> int:
+    """
+    Replace every ranking in Redis with one computed from the attempts table
+    and return the number of boards written.
+    """
+    totals, counts, quizzes = _load_from_sql()
+    pipe = redis_client.pipeline()
+    for key in redis_client.scan_iter('leaderboard:*'):
+        pipe.delete(key)
+    for board, user_totals in totals.items():
+        sum_key, count_key, rank_key = _board_keys(board)
+        pipe.hset(sum_key, mapping=user_totals)
+        pipe.hset(count_key, mapping=counts[board])
+        pipe.zadd(rank_key, {uid: user_totals[uid] / counts[board][uid]
+                             for uid in user_totals})
+    for quiz_id, members in quizzes.items():
+        pipe.zadd(_quiz_key(quiz_id), members)
+    pipe.execute()
+    return len(totals) + len(quizzes)
+
+
+def check_leaderboards() -> list:
+    """
+    Compare the Redis rankings with the attempts table and return a list of
+    human-readable mismatches (empty when consistent).
+    """
+    totals, counts, quizzes = _load_from_sql()
+    problems = []
+    boards = set(totals) | {key.split(':', 1)[1].rsplit(':', 1)[0]
+                            for key in redis_client.scan_iter('leaderboard:*:rank')}
+    for board in sorted(boards):
+        sum_key, count_key, rank_key = _board_keys(board)
+        redis_totals = {int(k): int(v) for k, v in redis_client.hgetall(sum_key).items()}
+        redis_counts = {int(k): int(v) for k, v in redis_client.hgetall(count_key).items()}
+        if redis_totals != dict(totals.get(board, {})):
+            problems.append(f"{board}: score sums differ")
+        if redis_counts != dict(counts.get(board, {})):
+            problems.append(f"{board}: attempt counts differ")
+        if redis_client.zcard(rank_key) != len(totals.get(board, {})):
+            problems.append(f"{board}: ranked user count differs")
+    quiz_ids = set(quizzes) | {int(key.rsplit(':', 1)[1])
+                               for key in redis_client.scan_iter('leaderboard:quiz:*')}
+    for quiz_id in sorted(quiz_ids):
+        members = set(redis_client.zrange(_quiz_key(quiz_id), 0, -1))
+        if members != set(quizzes.get(quiz_id, {})):
+            problems.append(f"quiz {quiz_id}: ranked attempts differ")
+    return problems
@@ -0,0 +1,51 @@
+import json
+import base64
+import datetime
+from sqlalchemy import tuple_, DateTime
+
+
+def encode_cursor(values) -> str:
+    """
+    Opaque cursor for the position after a row with these sort values.
+    """
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime.datetime) else v for v in values],
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """
+    Inverse of encode_cursor. Raises ValueError on a malformed cursor.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def keyset_page(query, columns: list, limit: int, cursor: str = None,
+                descending: bool = False, key=None) -> tuple:
+    """
+    Return (rows, next_cursor) for the page of query after cursor, ordered
+    by columns (a unique combination, typically ending with the id). Only
+    limit + 1 rows are read whatever the depth, provided an index matches
+    the filter and columns. key maps a row to the values of columns; by
+    default they are read as attributes named after the columns.
+    """
+    if cursor:
+        values = [datetime.datetime.fromisoformat(v) if isinstance(c.type, DateTime) and v else v
+                  for c, v in zip(columns, decode_cursor(cursor, len(columns)))]
+        if descending:
+            query = query.filter(tuple_(*columns) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+    order = [c.desc() for c in columns] if descending else columns
+    rows = query.order_by(*order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    key = key or (lambda row: [getattr(row, c.key) for c in columns])
+    return rows, encode_cursor(key(rows[-1]))
@@ -0,0 +1,121 @@
+import math
+import time
+import datetime
+from flask import current_app
+from extensions import db, cache, redis_client
+from models.subject import Subject
+from models.chapter import Chapter
+from models.quiz import Quiz
+from models.question import Question
+from services.cache_service import get_or_build, tagged_key
+from json_provider import encode_json
+
+# Catalog entries are invalidated by tag when admins edit them, so they can live long
+CATALOG_TIMEOUT = 24 * 3600
+FULL_QUIZ_TIMEOUT = CATALOG_TIMEOUT
+# Pinned payloads outlive the exam window by this much
+PIN_MARGIN = datetime.timedelta(minutes=5)
+
+
+def _local_timeout(endpoint: str):
+    return current_app.config['LOCAL_CACHE_TIMEOUTS'].get(endpoint)
+
+
+def full_quiz_cache_key(quiz_id: int) -> str:
+    return tagged_key(f"quiz_full:{quiz_id}", [f"quiz:{quiz_id}"])
+
+
+def get_subjects_catalog() -> bytes:
+    def build():
+        rows = db.session.query(Subject.id, Subject.name).filter(Subject.deleted_at == None)
+        return encode_json([row._asdict() for row in rows])
+    return get_or_build(tagged_key('catalog:subjects', ['subjects']), build, CATALOG_TIMEOUT,
+                        _local_timeout('subjects'))
+
+
+def get_chapters_catalog(subject_id: int) -> bytes:
+    def build():
+        rows = (db.session.query(Chapter.id, Chapter.name)
+                .filter(Chapter.subject_id == subject_id, Chapter.deleted_at == None))
+        return encode_json([row._asdict() for row in rows])
+    return get_or_build(tagged_key(f"catalog:subject:{subject_id}", [f"subject:{subject_id}"]),
+                        build, CATALOG_TIMEOUT, _local_timeout('chapters'))
+
+
+def get_quizzes_catalog(chapter_id: int) -> bytes:
+    def build():
+        rows = (db.session.query(Quiz.id, Quiz.title, Quiz.duration_min, Quiz.scheduled_at)
+                .filter(Quiz.chapter_id == chapter_id, Quiz.deleted_at == None))
+        return encode_json([row._asdict() for row in rows])
+    return get_or_build(tagged_key(f"catalog:chapter:{chapter_id}", [f"chapter:{chapter_id}"]),
+                        build, CATALOG_TIMEOUT, _local_timeout('quizzes'))
+
+
+def build_full_quiz(quiz_id: int):
+    """
+    Build the payload served by GET /quizzes/<id>/full, already encoded,
+    or None if the quiz does not exist.
+    """
+    quiz = (db.session.query(Quiz.id, Quiz.title, Quiz.duration_min)
+            .filter(Quiz.id == quiz_id, Quiz.deleted_at == None).first())
+    if quiz is None:
+        return None
+    questions = (db.session.query(Question.id, Question.statement, Question.option1,
+                                  Question.option2, Question.option3, Question.option4)
+                 .filter(Question.quiz_id == quiz_id, Question.deleted_at == None)
+                 .order_by(Question.id))
+    return encode_json({
+        'quiz_id': quiz.id,
+        'title': quiz.title,
+        'duration_min': quiz.duration_min,
+        'questions': [
+            {
+                'question_id': q.id,
+                'statement': q.statement,
+                'options': [q.option1, q.option2, q.option3, q.option4]
+            } for q in questions
+        ]
+    })
+
+
+def get_full_quiz_payload(quiz_id: int):
+    return get_or_build(full_quiz_cache_key(quiz_id),
+                        lambda: build_full_quiz(quiz_id), FULL_QUIZ_TIMEOUT,
+                        _local_timeout('full_quiz'))
+
+
+def prewarm_scheduled_quizzes(window: datetime.timedelta) -> list:
+    """
+    Render and pin in cache the payload of every quiz scheduled to start
+    within window, until its exam window is over. Returns the quiz ids.
+    """
+    now = datetime.datetime.utcnow()
+    quizzes = Quiz.query.filter(Quiz.deleted_at == None,
+                                Quiz.scheduled_at >= now,
+                                Quiz.scheduled_at <= now + window).all()
+    warmed = []
+    for quiz in quizzes:
+        payload = build_full_quiz(quiz.id)
+        ends_at = quiz.scheduled_at + datetime.timedelta(minutes=quiz.duration_min)
+        timeout = int((ends_at + PIN_MARGIN - now).total_seconds())
+        cache.set(full_quiz_cache_key(quiz.id), payload, timeout=timeout)
+        warmed.append(quiz.id)
+    return warmed
+
+
+def admit_attempt_start(rate: int):
+    """
+    Admission control for attempt creation: at most rate admissions per
+    second. Returns None when admitted, otherwise the number of seconds the
+    client should wait before retrying, based on how far over the limit the
+    current second already is.
+    """
+    second = int(time.time())
+    key = f"admission:start:{second}"
+    pipe = redis_client.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, 2)
+    position = pipe.execute()[0]
+    if position <= rate:
+        return None
+    return math.ceil((position - rate) / rate)
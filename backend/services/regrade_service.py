@@ -0,0 +1,101 @@
+from sqlalchemy import select, update, func, case, and_
+from extensions import db, redis_client
+from models.attempt import Attempt
+from models.answer import Answer
+from models.question import Question
+from services.stats_service import refresh_stats
+from services.leaderboard_service import adjust_scores
+from services.analytics_engine import bump_data_version
+from services.cache_service import invalidate_tags
+from services.submission_service import attempts_tag
+
+REGRADE_CHUNK_SIZE = 1000
+# Progress of a regrade job is kept this long after its last update
+PROGRESS_TTL = 24 * 3600
+
+
+def _progress_key(job_id: str) -> str:
+    return f"regrade:{job_id}"
+
+
+def get_regrade_progress(job_id: str) -> dict:
+    return redis_client.hgetall(_progress_key(job_id))
+
+
+def _set_progress(job_id: str, **fields) -> None:
+    if job_id is None:
+        return
+    pipe = redis_client.pipeline()
+    pipe.hset(_progress_key(job_id), mapping=fields)
+    pipe.expire(_progress_key(job_id), PROGRESS_TTL)
+    pipe.execute()
+
+
+def regrade_quizzes(quiz_ids: list, job_id: str = None,
+                    chunk_size: int = REGRADE_CHUNK_SIZE) -> dict:
+    """
+    Recompute the score of every graded attempt on these quizzes against
+    the current answer keys. Attempts are regraded by id range with one
+    UPDATE per chunk, each chunk committed with its leaderboard changes;
+    the question, quiz and monthly statistics involved are recomputed at
+    the end. Progress is recorded under job_id. Returns the number of
+    attempts checked and changed.
+    """
+    quiz_ids = sorted(set(quiz_ids))
+    # abandoned attempts are closed unscored and stay that way
+    scope = and_(Attempt.quiz_id.in_(quiz_ids), Attempt.submitted_at != None,
+                 Attempt.score != None)
+    total = db.session.query(func.count(Attempt.id)).filter(scope).scalar()
+    _set_progress(job_id, state='running', total=total, done=0, changed=0)
+
+    new_score = (select(func.coalesce(func.sum(case(
+                    (Answer.selected_option == Question.correct_option, 1), else_=0)), 0))
+                 .join(Question, and_(Question.id == Answer.question_id,
+                                      Question.deleted_at == None))
+                 .where(Answer.attempt_id == Attempt.id)
+                 .scalar_subquery())
+
+    done, changed, last_id, user_periods, user_ids = 0, 0, 0, set(), set()
+    try:
+        while True:
+            before = (db.session.query(Attempt.id, Attempt.user_id, Attempt.quiz_id,
+                                       Attempt.score, Attempt.submitted_at)
+                      .filter(scope, Attempt.id > last_id)
+                      .order_by(Attempt.id)
+                      .limit(chunk_size)
+                      .all())
+            if not before:
+                break
+            first_id, last_id = before[0].id, before[-1].id
+            # attempt details show the correct options, changed score or not
+            user_ids.update(row.user_id for row in before)
+            db.session.execute(update(Attempt)
+                               .where(scope, Attempt.id.between(first_id, last_id))
+                               .values(score=new_score)
+                               .execution_options(synchronize_session=False))
+            after = dict(db.session.query(Attempt.id, Attempt.score)
+                         .filter(scope, Attempt.id.between(first_id, last_id)))
+            db.session.commit()
+
+            regraded = [{
+                'attempt_id': row.id, 'user_id': row.user_id, 'quiz_id': row.quiz_id,
+                'old_score': row.score, 'score': after[row.id],
+                'submitted_at': row.submitted_at
+            } for row in before if after[row.id] != row.score]
+            adjust_scores(regraded)
+            user_periods.update((a['user_id'], f"{a['submitted_at']:%Y-%m}") for a in regraded)
+            done += len(before)
+            changed += len(regraded)
+            _set_progress(job_id, done=done, changed=changed)
+
+        refresh_stats(quiz_ids, user_periods)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        _set_progress(job_id, state='failed')
+        raise
+    bump_data_version(quiz_ids)
+    if user_ids:
+        invalidate_tags(attempts_tag(u) for u in user_ids)
+    _set_progress(job_id, state='done')
+    return {'attempts': done, 'changed': changed}
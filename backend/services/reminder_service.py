@@ -0,0 +1,91 @@
+import json
+import datetime
+from sqlalchemy import select, func, and_, or_
+from extensions import db, redis_client
+from models.user import User
+from models.attempt import Attempt
+from models.quiz import Quiz
+
+# Reminder run state is kept this long, so a failed run can be resumed
+RUN_TTL = 2 * 24 * 3600
+
+
+def reminder_candidates(now: datetime.datetime) -> list:
+    """
+    Return the users to remind as dicts with id, full_name, email and
+    new_quizzes: those with quizzes created since their last submission
+    (or in the last day), and those who have not submitted in a day.
+    One statement: the latest submission per user is joined against quiz
+    creation times and counted.
+    """
+    since = now - datetime.timedelta(days=1)
+    last = (select(Attempt.user_id, func.max(Attempt.submitted_at).label('last_active'))
+            .group_by(Attempt.user_id)
+            .subquery())
+    last_active = func.coalesce(last.c.last_active, since)
+    new_quizzes = func.count(Quiz.id)
+    query = (select(User.id, User.full_name, User.email, new_quizzes.label('new_quizzes'))
+             .outerjoin(last, last.c.user_id == User.id)
+             .outerjoin(Quiz, and_(Quiz.created_at > last_active, Quiz.deleted_at == None))
+             .where(User.role == 'user')
+             .group_by(User.id, User.full_name, User.email, last.c.last_active)
+             .having(or_(new_quizzes > 0,
+                         last.c.last_active == None,
+                         last.c.last_active < since))
+             .order_by(User.id))
+    return [dict(row._mapping) for row in db.session.execute(query)]
+
+
+def _run_key(run_id: str) -> str:
+    return f"reminders:{run_id}"
+
+
+def start_reminder_run(run_id: str, recipients_fn, chunk_size: int) -> list:
+    """
+    Split the run's recipients into chunks stored in Redis and return the
+    indexes of the chunks not yet sent. The recipients are computed (by
+    recipients_fn) only when the run is new; a repeated run resumes with
+    the chunks stored the first time.
+    """
+    key = _run_key(run_id)
+    if not redis_client.exists(f"{key}:chunks"):
+        recipients = recipients_fn()
+        chunks = {i // chunk_size: json.dumps(recipients[i:i + chunk_size])
+                  for i in range(0, len(recipients), chunk_size)}
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping={'recipients': len(recipients), 'chunks': len(chunks)})
+        if chunks:
+            pipe.hset(f"{key}:chunks", mapping=chunks)
+        else:
+            # an empty marker so the finished run is not recomputed
+            pipe.hset(f"{key}:chunks", '-', '[]')
+        for suffix in ('', ':chunks'):
+            pipe.expire(key + suffix, RUN_TTL)
+        pipe.execute()
+    done = redis_client.smembers(f"{key}:done")
+    return [int(i) for i in redis_client.hkeys(f"{key}:chunks")
+            if i != '-' and i not in done]
+
+
+def reminder_chunk(run_id: str, index: int) -> list:
+    return json.loads(redis_client.hget(f"{_run_key(run_id)}:chunks", index) or '[]')
+
+
+def mark_chunk_done(run_id: str, index: int) -> None:
+    key = f"{_run_key(run_id)}:done"
+    pipe = redis_client.pipeline()
+    pipe.sadd(key, index)
+    pipe.expire(key, RUN_TTL)
+    pipe.execute()
+
+
+def reminder_progress(run_id: str) -> dict:
+    """
+    Return recipients, chunks and chunks_done of a reminder run, or None.
+    """
+    state = redis_client.hgetall(_run_key(run_id))
+    if not state:
+        return None
+    return {'recipients': int(state['recipients']),
+            'chunks': int(state['chunks']),
+            'chunks_done': redis_client.scard(f"{_run_key(run_id)}:done")}
@@ -1,10 +1,15 @@
 from jinja2 import Environment, FileSystemLoader
 import os
-import uuid
+import glob
+import json
+import hashlib
 import datetime
+from sqlalchemy import select, func, Float, String, cast
 from extensions import db
 from models.attempt import Attempt
+from models.email import OutboundEmail
 from models.user import User
+from models.stats import UserMonthlyStats
 from weasyprint import HTML
 
 TEMPLATES_DIR = os.path.join(os.getcwd(), 'templates')
@@ -12,45 +17,124 @@ REPORTS_DIR = os.path.join(os.getcwd(), 'reports')
 if not os.path.exists(REPORTS_DIR):
     os.makedirs(REPORTS_DIR)
 
+REPORT_TEMPLATE = 'monthly_report.html'
 
-def generate_monthly_report(user_id: int, year: int, month: int) -> str:
+_env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
+
+
+def _template_digest() -> str:
+    source, _, _ = _env.loader.get_source(_env, REPORT_TEMPLATE)
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def monthly_report_inputs(year: int, month: int, user_ids: list = None) -> list:
     """
-    Generates a PDF monthly activity report for the user and returns the file path.
-    Includes quiz count, average score, and ranking.
+    Collect the inputs of the monthly reports of all users (or of user_ids)
+    with one ranking query over the month's stats and one attempts query.
+    Returns a JSON-serialisable dict per user, as consumed by render_monthly_report.
     """
-    # Fetch user and their attempts in the month
     start = datetime.datetime(year, month, 1)
     end = datetime.datetime(year + (month // 12), ((month % 12) + 1), 1)
+    period = f"{year}-{month:02d}"
+
+    average = cast(UserMonthlyStats.score_sum, Float) / UserMonthlyStats.attempt_count
+    ranked = (select(UserMonthlyStats.user_id,
+                     UserMonthlyStats.attempt_count,
+                     UserMonthlyStats.score_sum,
+                     UserMonthlyStats.score_min,
+                     UserMonthlyStats.score_max,
+                     UserMonthlyStats.time_spent_sec,
+                     func.rank().over(order_by=average.desc()).label('ranking'))
+              .where(UserMonthlyStats.period == period,
+                     UserMonthlyStats.attempt_count > 0)
+              .subquery())
+    query = (select(User.id, User.full_name, User.email, ranked)
+             .outerjoin(ranked, ranked.c.user_id == User.id)
+             .order_by(User.id))
+    attempts_query = (select(Attempt.user_id, Attempt.quiz_id, Attempt.score, Attempt.submitted_at)
+                      .where(Attempt.submitted_at >= start, Attempt.submitted_at < end)
+                      .order_by(Attempt.user_id, Attempt.submitted_at))
+    if user_ids is not None:
+        query = query.where(User.id.in_(user_ids))
+        attempts_query = attempts_query.where(Attempt.user_id.in_(user_ids))
+    else:
+        query = query.where(User.role == 'user')
+
+    attempts = {}
+    for row in db.session.execute(attempts_query):
+        attempts.setdefault(row.user_id, []).append({
+            'quiz_id': row.quiz_id,
+            'score': row.score,
+            'submitted_at': str(row.submitted_at),
+        })
+
+    inputs = []
+    for row in db.session.execute(query):
+        total = row.attempt_count or 0
+        stats = None
+        if total:
+            stats = {'score_min': row.score_min, 'score_max': row.score_max,
+                     'time_spent_sec': row.time_spent_sec}
+        inputs.append({
+            'user': {'id': row.id, 'full_name': row.full_name, 'email': row.email},
+            'year': year,
+            'month': month,
+            'total_quizzes': total,
+            'average_score': row.score_sum / total if total else 0,
+            'ranking': row.ranking,
+            'stats': stats,
+            'attempts': attempts.get(row.id, []),
+        })
+    return inputs
+
+
+def report_digest(inputs: dict) -> str:
+    """
+    Hash of everything a report is rendered from, template included.
+    """
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha1((_template_digest() + payload).encode()).hexdigest()
 
-    user = User.query.get(user_id)
-    attempts = (Attempt.query.filter(Attempt.user_id == user_id,
-                                     Attempt.submitted_at >= start,
-                                     Attempt.submitted_at < end).all())
-    total = len(attempts)
-    avg_score = sum(a.score for a in attempts) / total if total > 0 else 0
-
-    # Determine ranking among all users
-    scores_by_user = (db.session.query(
-        Attempt.user_id,
-        db.func.avg(Attempt.score).label('avg')).filter(
-            Attempt.submitted_at >= start, Attempt.submitted_at
-            < end).group_by(Attempt.user_id).order_by(db.desc('avg')).all())
-    ranking = next(
-        (idx + 1
-         for idx, (uid, _) in enumerate(scores_by_user) if uid == user_id),
-        None)
-
-    # Render HTML via Jinja2
-    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
-    template = env.get_template('monthly_report.html')
-    html = template.render(user=user,
-                           year=year,
-                           month=month,
-                           total_quizzes=total,
-                           average_score=avg_score,
-                           ranking=ranking,
-                           attempts=attempts)
-    filename = f"report_{user_id}_{year}_{month}_{uuid.uuid4().hex}.pdf"
-    filepath = os.path.join(REports_DIR, filename)
-    HTML(string=html).write_pdf(filepath)
-    return filepath
+
+def render_monthly_report(inputs: dict) -> tuple:
+    """
+    Render one report from its inputs and return (file path, rendered).
+    The file is named after the inputs' digest, so a report whose inputs
+    did not change since the last run is reused instead of rendered again.
+    Older renders for the same month are removed once no queued email
+    attaches them.
+    """
+    user_id, year, month = inputs['user']['id'], inputs['year'], inputs['month']
+    prefix = f"report_{user_id}_{year}_{month}_"
+    filepath = os.path.join(REPORTS_DIR, f"{prefix}{report_digest(inputs)[:16]}.pdf")
+    if os.path.exists(filepath):
+        return filepath, False
+
+    html = _env.get_template(REPORT_TEMPLATE).render(**inputs)
+    tmp_path = filepath + '.tmp'
+    HTML(string=html).write_pdf(tmp_path)
+    os.replace(tmp_path, filepath)
+    # drop the versions rendered from older inputs, unless an email still
+    # waiting in the outbox attaches them
+    stale = set(glob.glob(os.path.join(REPORTS_DIR, f"{prefix}*.pdf"))) - {filepath}
+    if stale:
+        stale -= _pending_attachments(prefix)
+    for path in stale:
+        os.remove(path)
+    return filepath, True
+
+
+def _pending_attachments(prefix: str) -> set:
+    rows = (db.session.query(OutboundEmail.attachments)
+            .filter(OutboundEmail.status.in_(('queued', 'sending')),
+                    cast(OutboundEmail.attachments, String).contains(prefix)))
+    return {path for (attachments,) in rows for path in attachments or []}
+
+
+def generate_monthly_report(user_id: int, year: int, month: int) -> str:
+    """
+    Generates a PDF monthly activity report for the user and returns the file path.
+    Includes quiz count, average score, and ranking.
+    """
+    inputs = monthly_report_inputs(year, month, user_ids=[user_id])
+    return render_monthly_report(inputs[0])[0]
@@ -0,0 +1,51 @@
+import re
+from sqlalchemy import text, table, column, or_, select, func, Float
+from extensions import db
+from models.search import SEARCH_INDEXES
+from services.pagination import keyset_page
+
+# Totals above this are reported as approximate instead of counted exactly
+SEARCH_COUNT_CAP = 1000
+
+
+def fts_query(q: str) -> str:
+    """
+    Turn user input into an FTS5 query matching every word as a prefix.
+    """
+    words = re.findall(r'\w+', q)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(Model, columns: list, q: str, limit: int, cursor: str = None) -> tuple:
+    """
+    Search Model's indexed columns for q, best matches first, and return
+    (rows, next_cursor, total, exact), rows holding the given columns of
+    each match (the id among them). Past SEARCH_COUNT_CAP matches counting
+    stops and total is that cap with exact False. Databases without FTS5
+    fall back to ilike, ordered by id.
+    """
+    query = db.session.query(*columns)
+    if hasattr(Model, 'deleted_at'):
+        query = query.filter(Model.deleted_at == None)
+
+    if db.engine.dialect.name == 'sqlite':
+        match = fts_query(q)
+        if not match:
+            return [], None, 0, True
+        fts = table(f"{Model.__tablename__}_fts", column('rowid'), column('rank', Float))
+        query = (query.join(fts, fts.c.rowid == Model.id)
+                 .filter(text(f"{fts.name} MATCH :match").bindparams(match=match)))
+        # fts5's rank column is the bm25 score, lower being more relevant
+        rows, next_cursor = keyset_page(query.add_columns(fts.c.rank), [fts.c.rank, Model.id],
+                                        limit, cursor, key=lambda row: [row.rank, row.id])
+        items = [row[:-1] for row in rows]
+    else:
+        columns = SEARCH_INDEXES[Model.__table__]
+        query = query.filter(or_(*[getattr(Model, c).ilike(f"%{q}%") for c in columns]))
+        items, next_cursor = keyset_page(query, [Model.id], limit, cursor)
+
+    capped = query.with_entities(Model.id).limit(SEARCH_COUNT_CAP + 1).subquery()
+    total = db.session.execute(select(func.count()).select_from(capped)).scalar()
+    if total > SEARCH_COUNT_CAP:
+        return items, next_cursor, SEARCH_COUNT_CAP, False
+    return items, next_cursor, total, True
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from sqlalchemy import func, case, delete, insert, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models.attempt import Attempt
+from models.answer import Answer
+from models.question import Question
+from models.stats import QuestionStats, QuizStats, UserMonthlyStats
+
+QUESTION_COUNTERS = ('answer_count', 'correct_count', 'option1_count',
+                     'option2_count', 'option3_count', 'option4_count')
+QUIZ_COUNTERS = ('attempt_count', 'score_sum', 'possible_sum')
+MONTHLY_COUNTERS = ('attempt_count', 'score_sum', 'time_spent_sec')
+
+
+def _upsert_increments(model, keys: list, counters: tuple, rows: list,
+                       extremes: tuple = ()) -> None:
+    """
+    Insert rows, or merge them into the existing row with the same keys:
+    counters are added, and for each (column, keep_lower) in extremes the
+    lower or higher value is kept.
+    """
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = dialect_insert(model)
+    set_ = {c: getattr(model, c) + getattr(stmt.excluded, c) for c in counters}
+    for column, keep_lower in extremes:
+        current, new = getattr(model, column), getattr(stmt.excluded, column)
+        replace = new < current if keep_lower else new > current
+        set_[column] = case((current == None, new), (replace, new), else_=current)
+    stmt = stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+    db.session.execute(stmt, rows)
+
+
+def _monthly_row(user_id: int, period: str) -> dict:
+    return {'user_id': user_id, 'period': period, 'attempt_count': 0,
+            'score_sum': 0, 'score_min': None, 'score_max': None,
+            'time_spent_sec': 0}
+
+
+def _add_to_monthly(row: dict, score: int, started_at, submitted_at) -> None:
+    row['attempt_count'] += 1
+    row['score_sum'] += score
+    row['score_min'] = score if row['score_min'] is None else min(row['score_min'], score)
+    row['score_max'] = score if row['score_max'] is None else max(row['score_max'], score)
+    row['time_spent_sec'] += max(int((submitted_at - started_at).total_seconds()), 0)
+
+
+def record_graded_attempts(graded: list) -> None:
+    """
+    Add a batch of graded attempts to the question, quiz and user monthly
+    statistics, in the caller's transaction. Each item is a dict with
+    user_id, quiz_id, answer_key, score, started_at, submitted_at and
+    answers (question_id / selected_option dicts).
+    """
+    questions = defaultdict(lambda: dict.fromkeys(QUESTION_COUNTERS, 0))
+    quizzes = defaultdict(lambda: dict.fromkeys(QUIZ_COUNTERS, 0))
+    monthly = {}
+    for attempt in graded:
+        answer_key = attempt['answer_key']
+        for ans in attempt['answers']:
+            qid, option = ans['question_id'], ans['selected_option']
+            if qid not in answer_key:
+                continue
+            counts = questions[(qid, attempt['quiz_id'])]
+            counts['answer_count'] += 1
+            counts['correct_count'] += answer_key[qid] == option
+            if option in (1, 2, 3, 4):
+                counts[f'option{option}_count'] += 1
+        quiz = quizzes[attempt['quiz_id']]
+        quiz['attempt_count'] += 1
+        quiz['score_sum'] += attempt['score']
+        quiz['possible_sum'] += len(answer_key)
+        period = f"{attempt['submitted_at']:%Y-%m}"
+        row = monthly.setdefault((attempt['user_id'], period),
+                                 _monthly_row(attempt['user_id'], period))
+        _add_to_monthly(row, attempt['score'], attempt['started_at'],
+                        attempt['submitted_at'])
+
+    _upsert_increments(QuestionStats, ['question_id'], QUESTION_COUNTERS, [
+        {'question_id': qid, 'quiz_id': quiz_id, **counts}
+        for (qid, quiz_id), counts in questions.items()])
+    _upsert_increments(QuizStats, ['quiz_id'], QUIZ_COUNTERS, [
+        {'quiz_id': quiz_id, **counts} for quiz_id, counts in quizzes.items()])
+    _upsert_increments(UserMonthlyStats, ['user_id', 'period'], MONTHLY_COUNTERS,
+                       list(monthly.values()),
+                       extremes=(('score_min', True), ('score_max', False)))
+
+
+def _question_stat_rows(quiz_ids: list = None) -> list:
+    def option_count(n):
+        return func.sum(case((Answer.selected_option == n, 1), else_=0))
+
+    query = (db.session.query(
+                Answer.question_id.label('question_id'),
+                Question.quiz_id.label('quiz_id'),
+                func.count(Answer.id).label('answer_count'),
+                func.sum(case((Answer.selected_option == Question.correct_option, 1),
+                              else_=0)).label('correct_count'),
+                option_count(1).label('option1_count'),
+                option_count(2).label('option2_count'),
+                option_count(3).label('option3_count'),
+                option_count(4).label('option4_count'))
+             .join(Question, Question.id == Answer.question_id)
+             .join(Attempt, Attempt.id == Answer.attempt_id)
+             # like grading, which skips questions missing from the answer key
+             .filter(Attempt.submitted_at != None, Question.deleted_at == None))
+    if quiz_ids is not None:
+        query = query.filter(Question.quiz_id.in_(quiz_ids))
+    return [dict(row._mapping) for row in query.group_by(Answer.question_id, Question.quiz_id)]
+
+
+def _quiz_stat_rows(quiz_ids: list = None) -> list:
+    counts_query = (db.session.query(Question.quiz_id, func.count(Question.id))
+                    .filter(Question.deleted_at == None))
+    query = (db.session.query(Attempt.quiz_id, func.count(Attempt.id), func.sum(Attempt.score))
+             .filter(Attempt.submitted_at != None, Attempt.score != None))
+    if quiz_ids is not None:
+        counts_query = counts_query.filter(Question.quiz_id.in_(quiz_ids))
+        query = query.filter(Attempt.quiz_id.in_(quiz_ids))
+    question_counts = dict(counts_query.group_by(Question.quiz_id))
+    return [{
+        'quiz_id': quiz_id,
+        'attempt_count': attempt_count,
+        'score_sum': score_sum or 0,
+        'possible_sum': attempt_count * question_counts.get(quiz_id, 0)
+    } for quiz_id, attempt_count, score_sum in query.group_by(Attempt.quiz_id)]
+
+
+def _monthly_stat_rows(user_periods: set = None) -> list:
+    # months are bucketed in Python so the backfill runs on any SQL backend
+    query = (db.session.query(Attempt.user_id, Attempt.score,
+                              Attempt.started_at, Attempt.submitted_at)
+             .filter(Attempt.submitted_at != None, Attempt.score != None))
+    if user_periods is not None:
+        query = query.filter(Attempt.user_id.in_({user_id for user_id, _ in user_periods}))
+    monthly = {}
+    for user_id, score, started_at, submitted_at in query.yield_per(5000):
+        period = f"{submitted_at:%Y-%m}"
+        if user_periods is not None and (user_id, period) not in user_periods:
+            continue
+        row = monthly.setdefault((user_id, period), _monthly_row(user_id, period))
+        _add_to_monthly(row, score, started_at, submitted_at)
+    return list(monthly.values())
+
+
+def rebuild_stats() -> tuple:
+    """
+    Recompute question_stats, quiz_stats and user_monthly_stats from the
+    answers and attempts tables and return the number of (question, quiz,
+    user month) rows written.
+    """
+    db.session.execute(delete(QuestionStats))
+    db.session.execute(delete(QuizStats))
+    db.session.execute(delete(UserMonthlyStats))
+
+    question_rows = _question_stat_rows()
+    quiz_rows = _quiz_stat_rows()
+    monthly = _monthly_stat_rows()
+    if question_rows:
+        db.session.execute(insert(QuestionStats), question_rows)
+    if quiz_rows:
+        db.session.execute(insert(QuizStats), quiz_rows)
+    if monthly:
+        db.session.execute(insert(UserMonthlyStats), monthly)
+    db.session.commit()
+    return len(question_rows), len(quiz_rows), len(monthly)
+
+
+def refresh_stats(quiz_ids: list, user_periods: set) -> None:
+    """
+    Recompute, in the caller's transaction, the question and quiz statistics
+    of these quizzes and the monthly statistics of these (user_id, period)
+    pairs, e.g. after their attempts were regraded.
+    """
+    db.session.execute(delete(QuestionStats).where(QuestionStats.quiz_id.in_(quiz_ids)))
+    db.session.execute(delete(QuizStats).where(QuizStats.quiz_id.in_(quiz_ids)))
+    question_rows = _question_stat_rows(quiz_ids)
+    quiz_rows = _quiz_stat_rows(quiz_ids)
+    if question_rows:
+        db.session.execute(insert(QuestionStats), question_rows)
+    if quiz_rows:
+        db.session.execute(insert(QuizStats), quiz_rows)
+
+    if user_periods:
+        monthly = _monthly_stat_rows(user_periods)
+        db.session.execute(delete(UserMonthlyStats).where(
+            tuple_(UserMonthlyStats.user_id, UserMonthlyStats.period).in_(list(user_periods))))
+        if monthly:
+            db.session.execute(insert(UserMonthlyStats), monthly)
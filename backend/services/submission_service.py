@@ -0,0 +1,263 @@
+import json
+import datetime
+from sqlalchemy import insert, update, delete, func, cast, String
+from extensions import db, redis_client
+from models.attempt import Attempt
+from models.answer import Answer
+from models.quiz import Quiz
+from services.answer_key_service import get_answer_key, grade
+from services.autosave_service import (
+    get_buffered_answers, clear_buffered_answers, begin_attempt_writes)
+from services.leaderboard_service import record_scores
+from services.stats_service import record_graded_attempts
+from services.analytics_engine import bump_data_version
+from services.cache_service import invalidate_tags
+
+SUBMISSION_STREAM = 'submissions'
+SUBMISSION_GROUP = 'submission-writers'
+# Entries that could not be persisted even on their own end up here
+DEAD_LETTER_STREAM = 'submissions:dead'
+# Entries a worker picked up but never acknowledged are reclaimed after this
+RECLAIM_IDLE_MS = 60 * 1000
+STATUS_TTL = 24 * 3600
+
+
+def _status_key(attempt_id: int) -> str:
+    return f"submission:{attempt_id}"
+
+
+def attempts_tag(user_id) -> str:
+    # cache tag of everything derived from one user's attempts
+    return f"attempts:user:{int(user_id)}"
+
+
+def persist_submissions(submissions: list) -> dict:
+    """
+    Grade and store a batch of submissions in one transaction and return
+    {attempt_id: score}. Each submission is a dict with attempt_id,
+    submitted_at and answers; attempts that are already submitted are skipped.
+    """
+    attempt_ids = [s['attempt_id'] for s in submissions]
+    begin_attempt_writes()
+    open_attempts = {
+        attempt_id: (quiz_id, user_id, started_at)
+        for attempt_id, quiz_id, user_id, started_at in
+        db.session.query(Attempt.id, Attempt.quiz_id, Attempt.user_id, Attempt.started_at)
+        .filter(Attempt.id.in_(attempt_ids), Attempt.submitted_at == None)
+        # serializes with flush_buffered_answers writing the same attempts
+        .with_for_update()
+    }
+
+    answer_rows, attempt_rows, graded, scores = [], [], [], {}
+    for sub in submissions:
+        attempt_id = sub['attempt_id']
+        if attempt_id not in open_attempts or attempt_id in scores:
+            continue
+        quiz_id, user_id, started_at = open_attempts[attempt_id]
+        rows = [{
+            'attempt_id': attempt_id,
+            'question_id': ans['question_id'],
+            'selected_option': ans['selected_option']
+        } for ans in sub['answers']]
+        answer_key = get_answer_key(quiz_id)
+        scores[attempt_id] = grade(answer_key, rows)
+        answer_rows.extend(rows)
+        attempt_rows.append({
+            'id': attempt_id,
+            'submitted_at': sub['submitted_at'],
+            'score': scores[attempt_id]
+        })
+        graded.append({
+            'attempt_id': attempt_id,
+            'user_id': user_id,
+            'quiz_id': quiz_id,
+            'score': scores[attempt_id],
+            'started_at': started_at,
+            'submitted_at': sub['submitted_at'],
+            'answer_key': answer_key,
+            'answers': rows
+        })
+
+    if scores:
+        # drop rows flushed by autosave; the submission carries the final state
+        db.session.execute(delete(Answer).where(Answer.attempt_id.in_(list(scores))))
+    if answer_rows:
+        db.session.execute(insert(Answer), answer_rows)
+    if attempt_rows:
+        db.session.execute(update(Attempt), attempt_rows)
+    record_graded_attempts(graded)
+    db.session.commit()
+    record_scores(graded)
+    bump_data_version(g['quiz_id'] for g in graded)
+    if graded:
+        invalidate_tags(attempts_tag(g['user_id']) for g in graded)
+    return scores
+
+
+def enqueue_submission(attempt_id: int, answers: list,
+                       submitted_at: datetime.datetime):
+    """
+    Append a submission to the durable stream and return its receipt, or None
+    if this attempt has already been queued.
+    """
+    status_key = _status_key(attempt_id)
+    if not redis_client.hsetnx(status_key, 'state', 'queued'):
+        return None
+    receipt = redis_client.xadd(SUBMISSION_STREAM, {
+        'attempt_id': attempt_id,
+        'submitted_at': submitted_at.isoformat(),
+        'answers': json.dumps(answers)
+    })
+    redis_client.hset(status_key, 'receipt', receipt)
+    redis_client.expire(status_key, STATUS_TTL)
+    return receipt
+
+
+def get_submission_status(attempt_id: int) -> dict:
+    """
+    Return the queued submission state of an attempt (empty if never queued).
+    """
+    return redis_client.hgetall(_status_key(attempt_id))
+
+
+def _ensure_group():
+    try:
+        redis_client.xgroup_create(SUBMISSION_STREAM, SUBMISSION_GROUP,
+                                   id='0', mkstream=True)
+    except Exception as err:
+        if 'BUSYGROUP' not in str(err):
+            raise
+
+
+def _decode_submission(fields: dict) -> dict:
+    return {
+        'attempt_id': int(fields['attempt_id']),
+        'submitted_at': datetime.datetime.fromisoformat(fields['submitted_at']),
+        'answers': json.loads(fields['answers'])
+    }
+
+
+def _persist_entries(entries: list) -> dict:
+    """
+    Persist stream entries as one batch; if that fails, persist them one at
+    a time so a bad entry cannot hold back the others, and move the ones
+    that still fail to the dead-letter stream. Returns {attempt_id: score}.
+    """
+    try:
+        return persist_submissions([_decode_submission(fields) for _, fields in entries])
+    except Exception:
+        db.session.rollback()
+
+    scores = {}
+    for _, fields in entries:
+        try:
+            scores.update(persist_submissions([_decode_submission(fields)]))
+        except Exception as err:
+            db.session.rollback()
+            pipe = redis_client.pipeline()
+            pipe.xadd(DEAD_LETTER_STREAM, {**fields, 'error': repr(err)})
+            pipe.hset(_status_key(fields['attempt_id']),
+                      mapping={'state': 'failed', 'error': repr(err)})
+            pipe.execute()
+    return scores
+
+
+def drain_submissions(consumer: str, batch_size: int) -> int:
+    """
+    Persist queued submissions in batches until the stream is empty and
+    return how many were written. Entries left pending by a crashed worker
+    are reclaimed first; entries that fail to persist are dead-lettered.
+    """
+    _ensure_group()
+    # Redis 7 adds a third element (ids of deleted entries) to this reply
+    entries = redis_client.xautoclaim(
+        SUBMISSION_STREAM, SUBMISSION_GROUP, consumer,
+        min_idle_time=RECLAIM_IDLE_MS, count=batch_size)[1]
+    written = 0
+    while True:
+        if not entries:
+            streams = redis_client.xreadgroup(
+                SUBMISSION_GROUP, consumer, {SUBMISSION_STREAM: '>'},
+                count=batch_size)
+            entries = streams[0][1] if streams else []
+        if not entries:
+            return written
+
+        scores = _persist_entries(entries)
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipe = redis_client.pipeline()
+        for attempt_id, score in scores.items():
+            pipe.hset(_status_key(attempt_id),
+                      mapping={'state': 'persisted', 'score': score})
+        pipe.xack(SUBMISSION_STREAM, SUBMISSION_GROUP, *entry_ids)
+        pipe.xdel(SUBMISSION_STREAM, *entry_ids)
+        pipe.execute()
+        written += len(scores)
+        entries = []
+
+
+def _expired_before(now: datetime.datetime):
+    """
+    SQL condition for attempts whose quiz's time limit ended before now.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        ends_at = func.strftime('%Y-%m-%d %H:%M:%f', Attempt.started_at,
+                                '+' + cast(Quiz.duration_min, String) + ' minutes')
+        return ends_at < now.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return Attempt.started_at + func.make_interval(0, 0, 0, 0, 0, Quiz.duration_min) < now
+
+
+def close_expired_attempts(batch_size: int) -> int:
+    """
+    Submit every open attempt whose time limit has passed, grading whatever
+    answers were autosaved, and return how many were closed. Attempts
+    abandoned without any answer are closed unscored, so they stay out of
+    the rankings and statistics like before. Attempts with a queued
+    write-behind submission are left to the submission writer, unless it
+    dead-lettered the submission.
+    """
+    now = datetime.datetime.utcnow()
+    closed, last_id = 0, 0
+    while True:
+        expired = (db.session.query(Attempt.id, Attempt.user_id, Attempt.started_at,
+                                    Quiz.duration_min)
+                   .join(Quiz, Quiz.id == Attempt.quiz_id)
+                   .filter(Attempt.submitted_at == None, Attempt.id > last_id,
+                           _expired_before(now))
+                   .order_by(Attempt.id)
+                   .limit(batch_size)
+                   .all())
+        if not expired:
+            return closed
+        last_id = expired[-1].id
+
+        chunk = [(a.id, a.user_id, a.started_at + datetime.timedelta(minutes=a.duration_min))
+                 for a in expired
+                 if get_submission_status(a.id).get('state') in (None, 'failed')]
+        answers = {aid: get_buffered_answers(aid) for aid, _, _ in chunk}
+        # buffers that already expired fall back to the rows flushed earlier
+        missing = [aid for aid, buffered in answers.items() if not buffered]
+        if missing:
+            for aid, qid, option in (db.session.query(
+                    Answer.attempt_id, Answer.question_id, Answer.selected_option)
+                    .filter(Answer.attempt_id.in_(missing))):
+                answers[aid].append({'question_id': qid, 'selected_option': option})
+
+        abandoned = [(aid, uid, ends_at) for aid, uid, ends_at in chunk if not answers[aid]]
+        if abandoned:
+            db.session.execute(update(Attempt).where(Attempt.submitted_at == None)
+                               .execution_options(synchronize_session=None), [
+                {'id': aid, 'submitted_at': ends_at, 'score': None}
+                for aid, _, ends_at in abandoned])
+            db.session.commit()
+            invalidate_tags(attempts_tag(uid) for _, uid, _ in abandoned)
+
+        scores = persist_submissions([{
+            'attempt_id': aid,
+            'submitted_at': ends_at,
+            'answers': answers[aid]
+        } for aid, _, ends_at in chunk if answers[aid]])
+        for aid, _, _ in chunk:
+            clear_buffered_answers(aid)
+        closed += len(scores) + len(abandoned)
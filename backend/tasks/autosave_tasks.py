@@ -0,0 +1,12 @@
+from celery import shared_task
+from services.autosave_service import flush_buffered_answers
+
+AUTOSAVE_FLUSH_BATCH = 200
+
+
+@shared_task
+def flush_autosaved_answers():
+    """
+    Periodic Celery task to move autosaved answers from Redis to the database.
+    """
+    return {'flushed': flush_buffered_answers(AUTOSAVE_FLUSH_BATCH)}
@@ -0,0 +1,13 @@
+from celery import shared_task
+from flask import current_app
+from services.email_service import dispatch_outbox
+
+
+@shared_task
+def dispatch_email_outbox():
+    """
+    Send due messages from the email outbox.
+    """
+    config = current_app.config
+    return dispatch_outbox(config['EMAIL_BATCH_SIZE'], config['EMAIL_SEND_RATE'],
+                           config['EMAIL_MAX_ATTEMPTS'], config['EMAIL_RETRY_BASE_SEC'])
@@ -1,24 +1,84 @@
-from celery import shared_task
-from extensions import cache
-from services.export_service import generate_attempts_csv, generate_all_quizzes_csv
+from celery import shared_task, uuid
+from flask import current_app
+from extensions import cache, redis_client
+from services.export_service import (
+    generate_attempts_csv, generate_all_quizzes_csv, attempts_fingerprint,
+    quizzes_fingerprint, attempts_export_filename, quizzes_export_filename,
+    find_export, sweep_exports)
+from services.parquet_export_service import export_parquet
+
+# Upper bound on how long an export job may be considered in flight
+EXPORT_INFLIGHT_TIMEOUT = 600
+
 
 @shared_task(bind=True)
-def generate_user_attempts_csv(self, user_id: int):
+def generate_user_attempts_csv(self, user_id: int, fingerprint: str = None):
     """
     Celery task to generate CSV and store the download path in cache.
     """
-    filepath = generate_attempts_csv(user_id)
+    try:
+        filepath = generate_attempts_csv(user_id, fingerprint)
+    finally:
+        if fingerprint:
+            redis_client.delete(f"export:inflight:{fingerprint}")
     # Cache the filepath for retrieval (e.g., 1 hour expiry)
     cache_key = f"export_user_{user_id}_{self.request.id}"
     cache.set(cache_key, filepath, timeout=3600)
     return {'filepath': filepath}
 
 @shared_task(bind=True)
-def generate_admin_quizzes_csv(self):
+def generate_admin_quizzes_csv(self, fingerprint: str = None):
     """
     Celery task to generate CSV of all quizzes and store the download path in cache.
     """
-    filepath = generate_all_quizzes_csv()
+    try:
+        filepath = generate_all_quizzes_csv(fingerprint)
+    finally:
+        if fingerprint:
+            redis_client.delete(f"export:inflight:{fingerprint}")
     cache_key = f"export_admin_quizzes_{self.request.id}"
     cache.set(cache_key, filepath, timeout=3600)
     return {'filepath': filepath}
+
+@shared_task
+def export_attempts_parquet(full: bool = False):
+    """
+    Celery task to sync attempts and answers to the partitioned Parquet dataset.
+    """
+    return export_parquet(full=full)
+
+@shared_task
+def sweep_export_dir():
+    """
+    Periodic Celery task to keep the exports directory under its size cap.
+    """
+    return {'deleted': sweep_exports(current_app.config['EXPORT_DIR_MAX_BYTES'])}
+
+
+def _request_export(task, filename: str, fingerprint: str, *args) -> dict:
+    """
+    Return the existing export for this fingerprint, the job already building
+    it, or a newly started job, in that order.
+    """
+    filepath = find_export(filename)
+    if filepath:
+        return {'status': 'ready', 'download': f"/exports/{filename}"}
+    inflight_key = f"export:inflight:{fingerprint}"
+    task_id = uuid()
+    if redis_client.set(inflight_key, task_id, nx=True, ex=EXPORT_INFLIGHT_TIMEOUT):
+        task.apply_async(args=(*args, fingerprint), task_id=task_id)
+        return {'status': 'queued', 'job_id': task_id}
+    return {'status': 'queued', 'job_id': redis_client.get(inflight_key) or task_id}
+
+
+def request_user_attempts_export(user_id: int) -> dict:
+    fingerprint = attempts_fingerprint(user_id)
+    return _request_export(generate_user_attempts_csv,
+                           attempts_export_filename(user_id, fingerprint),
+                           fingerprint, user_id)
+
+
+def request_admin_quizzes_export() -> dict:
+    fingerprint = quizzes_fingerprint()
+    return _request_export(generate_admin_quizzes_csv,
+                           quizzes_export_filename(fingerprint), fingerprint)
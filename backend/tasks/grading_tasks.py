@@ -0,0 +1,11 @@
+from celery import shared_task
+from services.regrade_service import regrade_quizzes
+
+
+@shared_task(bind=True)
+def regrade_quiz_attempts(self, quiz_ids: list):
+    """
+    Regrade the submitted attempts of these quizzes, reporting progress
+    under the task id.
+    """
+    return regrade_quizzes(quiz_ids, job_id=self.request.id)
@@ -0,0 +1,13 @@
+from celery import shared_task
+import datetime
+from services.quiz_service import prewarm_scheduled_quizzes
+
+PREWARM_WINDOW = datetime.timedelta(minutes=10)
+
+
+@shared_task
+def prewarm_quiz_payloads():
+    """
+    Periodic Celery task to pin payloads of soon-to-start quizzes in cache.
+    """
+    return {'quiz_ids': prewarm_scheduled_quizzes(PREWARM_WINDOW)}
@@ -1,41 +1,43 @@
-from celery import shared_task
-from extensions import cache, db
-from models.user import User
-from models.attempt import Attempt
-from models.quiz import Quiz
-from services.report_service import generate_monthly_report
-from services.email_service import send_email
+from celery import shared_task, group
+from flask import current_app
+from services.report_service import monthly_report_inputs, render_monthly_report
+from services.email_service import queue_emails
+from services.reminder_service import (
+    reminder_candidates, start_reminder_run, reminder_chunk, mark_chunk_done)
 import datetime
 
 @shared_task
-def send_daily_reminders():
+def send_daily_reminders(run_id: str = None):
     """
     Send reminders to users who haven't attempted any quiz in the last 24 hours
-    or if new quizzes exist since their last visit.
+    or if new quizzes exist since their last visit. Recipients are sent in
+    chunks by parallel subtasks; running the task again for the same run_id
+    (by default, today's date) only resends the chunks that did not finish.
     """
     now = datetime.datetime.utcnow()
-    since = now - datetime.timedelta(days=1)
-    users = User.query.filter_by(role='user').all()
-    for user in users:
-        last_attempt = (
-            Attempt.query
-            .filter(Attempt.user_id == user.id)
-            .order_by(Attempt.submitted_at.desc())
-            .first()
-        )
-        
-        last_active = last_attempt.submitted_at if last_attempt else since
-        
-        new_quizzes_count = Quiz.query.filter(Quiz.created_at > last_active).count()
+    run_id = run_id or now.date().isoformat()
+    pending = start_reminder_run(run_id, lambda: reminder_candidates(now),
+                                 current_app.config['REMINDER_CHUNK_SIZE'])
+    group(send_reminder_chunk.s(run_id, index) for index in pending).apply_async()
+    return {'run_id': run_id, 'chunks': len(pending)}
 
-        if new_quizzes_count > 0:
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def send_reminder_chunk(run_id: str, index: int):
+    """
+    Queue the reminder emails of one chunk of a reminder run.
+    """
+    messages = []
+    for user in reminder_chunk(run_id, index):
+        if user['new_quizzes'] > 0:
             subject = "New Quizzes Available!"
-            body = f"Hi {user.full_name},\n\nThere are {new_quizzes_count} new quizzes available for you to attempt. Log in now to check them out!"
-            send_email(user.email, subject, body)
-        elif not last_attempt or last_attempt.submitted_at < since:
+            body = f"Hi {user['full_name']},\n\nThere are {user['new_quizzes']} new quizzes available for you to attempt. Log in now to check them out!"
+        else:
             subject = "Quiz Reminder"
-            body = f"Hi {user.full_name},\n\nIt's been a while since your last quiz attempt. Please log in to take new quizzes!"
-            send_email(user.email, subject, body)
+            body = f"Hi {user['full_name']},\n\nIt's been a while since your last quiz attempt. Please log in to take new quizzes!"
+        messages.append({'to': user['email'], 'subject': subject, 'body': body})
+    queue_emails(messages)
+    mark_chunk_done(run_id, index)
+    return len(messages)
 
 @shared_task
 def send_monthly_reports():
@@ -48,11 +50,25 @@ def send_monthly_reports():
     if month == 12:
         year -= 1
 
-    users = User.query.filter_by(role='user').all()
-    for user in users:
-        report_path = generate_monthly_report(user.id, year, month)
-        subject = f"Your Activity Report for {year}-{month:02d}"
-        # Read HTML content
-        with open(report_path, 'r') as f:
-            html_body = f.read()
-        send_email(user.email, subject, html_body, attachments=[report_path])
\ No newline at end of file
+    inputs = monthly_report_inputs(year, month)
+    size = current_app.config['REPORT_CHUNK_SIZE']
+    group(render_and_send_reports.s(inputs[i:i + size])
+          for i in range(0, len(inputs), size)).apply_async()
+    return len(inputs)
+
+@shared_task
+def render_and_send_reports(inputs):
+    """
+    Render one chunk of monthly reports and queue their mails.
+    """
+    rendered, messages = 0, []
+    for report in inputs:
+        report_path, fresh = render_monthly_report(report)
+        rendered += fresh
+        subject = f"Your Activity Report for {report['year']}-{report['month']:02d}"
+        body = (f"<p>Hi {report['user']['full_name']},</p>"
+                f"<p>Your activity report for {report['year']}-{report['month']:02d} is attached.</p>")
+        messages.append({'to': report['user']['email'], 'subject': subject,
+                         'body': body, 'attachments': [report_path]})
+    queue_emails(messages)
+    return rendered
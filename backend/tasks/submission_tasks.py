@@ -0,0 +1,34 @@
+from celery import shared_task
+from flask import current_app
+from extensions import redis_client
+from services.submission_service import drain_submissions, close_expired_attempts
+
+# Submissions arriving within this window are persisted by the same task
+DRAIN_DELAY = 1
+
+
+@shared_task(bind=True)
+def persist_queued_submissions(self):
+    """
+    Celery task to grade and store queued submissions in batched transactions.
+    """
+    batch_size = current_app.config.get('SUBMISSION_BATCH_SIZE', 500)
+    written = drain_submissions(self.request.hostname or self.request.id, batch_size)
+    return {'written': written}
+
+
+@shared_task
+def close_expired_open_attempts():
+    """
+    Periodic Celery task to submit open attempts past their time limit.
+    """
+    batch_size = current_app.config.get('SUBMISSION_BATCH_SIZE', 500)
+    return {'closed': close_expired_attempts(batch_size)}
+
+
+def schedule_submission_drain():
+    """
+    Queue one drain task per DRAIN_DELAY window instead of one per submission.
+    """
+    if redis_client.set('submissions:drain_scheduled', 1, nx=True, ex=DRAIN_DELAY):
+        persist_queued_submissions.apply_async(countdown=DRAIN_DELAY)
@@ -1,6 +1,9 @@
 // src/api.js
 const API_ROOT = window.API_ROOT || 'http://129.159.230.51:5000/api';
 
+// Last response body and ETag of each GET path, revalidated with If-None-Match
+const etagCache = new Map();
+
 export function apiFetch(path, options = {}) {
   const token = localStorage.getItem('access_token');
   const headers = {
@@ -8,12 +11,31 @@ export function apiFetch(path, options = {}) {
     ...options.headers,
   };
   if (token) headers['Authorization'] = 'Bearer ' + token;
+  const isGet = !options.method || options.method.toUpperCase() === 'GET';
+  const cached = isGet ? etagCache.get(path) : null;
+  if (cached) headers['If-None-Match'] = cached.etag;
   return fetch(`${API_ROOT}${path}`, {
     ...options,
     headers,
   }).then(async res => {
+    if (res.status === 304 && cached) return cached.data;
     const data = await res.json().catch(() => ({}));
     if (!res.ok) throw { ...data, status: res.status };
+    const etag = res.headers.get('ETag');
+    if (isGet && etag) etagCache.set(path, { etag, data });
     return data;
   });
-}
\ No newline at end of file
+}
+// Follows next_cursor through a paginated endpoint and returns all items.
+export async function apiFetchAll(path, options = {}) {
+  const sep = path.includes('?') ? '&' : '?';
+  let items = [];
+  let cursor = null;
+  do {
+    const page = await apiFetch(
+      cursor ? `${path}${sep}cursor=${encodeURIComponent(cursor)}` : path, options);
+    items = items.concat(page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+}